@@ -4,14 +4,32 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from pathlib import Path
-import hashlib
+import os
 import sqlite3
-from typing import Iterable, List
+import time
+from itertools import groupby
+from operator import itemgetter
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from hash_cache import HashCache
+    from instrumentation import ScanInstrumentation, ScanReport
 
 # List of supported audio file extensions. This can be customised per instance
 # but is defined here for easy reuse and configuration.
 DEFAULT_FORMATS = [".mp3", ".shn", ".aiff", ".wav", ".m4a", ".flac"]
 
+# Hash algorithms accepted by :func:`file_hash`.  Their hex digests all have
+# different lengths, so the algorithm behind a stored hash can be recovered.
+HASH_ALGORITHMS = ("sha1", "md5", "sha256", "blake2b")
+_DIGEST_HEX_LENGTHS = {"sha1": 40, "md5": 32, "sha256": 64, "blake2b": 128}
+
+# Read size used by :class:`AudioScanner` when hashing.
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# ``path -> (size, mtime_ns, filehash)`` for files already in a repository.
+KnownFiles = Dict[str, Tuple[int, int, str]]
+
 
 @dataclass
 class AudioFile:
@@ -22,10 +40,17 @@ class AudioFile:
     path: Path
     extension: str
     filehash: str
+    size: int = 0
+    mtime_ns: int = 0
 
 
-def file_hash(path: Path, chunk_size: int = 1024) -> str:
-    """Return a SHA-1 hash for ``path``.
+def file_hash(
+    path: Path,
+    chunk_size: int = 1024,
+    algorithm: str = "sha1",
+    cache: Optional["HashCache"] = None,
+) -> str:
+    """Return the hex digest of ``path`` (SHA-1 by default).
 
     Parameters
     ----------
@@ -33,13 +58,68 @@ def file_hash(path: Path, chunk_size: int = 1024) -> str:
         Path to the file whose contents should be hashed.
     chunk_size:
         Number of bytes to read per iteration. Defaults to 1024.
+    algorithm:
+        Name of the :mod:`hashlib` algorithm to use; one of
+        :data:`HASH_ALGORITHMS`.
+    cache:
+        Optional :class:`hash_cache.HashCache` consulted before reading the
+        file and updated afterwards.
     """
 
-    h = hashlib.sha1()
-    with path.open("rb") as f:
+    if cache is not None:
+        st = os.stat(path)
+        cached = cache.get(st, algorithm)
+        if cached is not None:
+            return cached
+
+    # Imported here so the command line can start without loading hashlib.
+    import hashlib
+
+    h = hashlib.new(algorithm)
+    with Path(path).open("rb") as f:
         for chunk in iter(lambda: f.read(chunk_size), b""):
             h.update(chunk)
-    return h.hexdigest()
+    digest = h.hexdigest()
+    if cache is not None:
+        cache.put(st, algorithm, digest)
+    return digest
+
+
+def algorithm_for_digest(filehash: str) -> str:
+    """Return the member of :data:`HASH_ALGORITHMS` that produced ``filehash``."""
+
+    for name in HASH_ALGORITHMS:
+        if len(filehash) == _DIGEST_HEX_LENGTHS[name]:
+            return name
+    raise ValueError(f"Unrecognised digest length: {len(filehash)}")
+
+
+def _bounded_map(pool, func, items: Iterable, window: int) -> Iterator:
+    """Like ``pool.map`` but keep at most ``window`` tasks in flight."""
+
+    from collections import deque
+
+    pending: deque = deque()
+    for item in items:
+        pending.append(pool.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def path_range(root: Path) -> Tuple[str, str]:
+    """Return ``(low, high)`` bounds matching stored paths beneath ``root``.
+
+    ``low <= path < high`` selects every descendant of ``root`` using the
+    ``path`` primary key index, without matching sibling directories that
+    merely share a prefix (``40_Muze`` vs ``40_Muze_Backup``).
+    """
+
+    prefix = str(Path(root))
+    if not prefix.endswith(os.sep):
+        prefix += os.sep
+    return prefix, prefix + "\U0010ffff"
 
 
 class AudioScanner:
@@ -48,45 +128,171 @@ class AudioScanner:
     Parameters
     ----------
     root:
-        Root directory to search.
+        Root directory to search.  It is resolved to an absolute path so the
+        same files are always stored under the same keys, whichever way the
+        root was spelled.
     formats:
         Iterable of file extensions to include. Extensions are compared in a
         case-insensitive manner.
+    algorithm:
+        Hash algorithm passed to :func:`file_hash`.
+    workers:
+        Number of threads hashing files concurrently.  ``1`` hashes in the
+        calling thread.
+    chunk_size:
+        Read size used when hashing.
+    cache:
+        Optional :class:`hash_cache.HashCache` consulted before a file is read.
     """
 
-    def __init__(self, root: Path, formats: Iterable[str] = DEFAULT_FORMATS) -> None:
-        self.root = Path(root)
+    def __init__(
+        self,
+        root: Path,
+        formats: Iterable[str] = DEFAULT_FORMATS,
+        algorithm: str = "sha1",
+        workers: int = 1,
+        chunk_size: int = HASH_CHUNK_SIZE,
+        cache: Optional["HashCache"] = None,
+    ) -> None:
+        if algorithm not in HASH_ALGORITHMS:
+            raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+        self.root = Path(root).resolve()
         self.formats = [f.lower() for f in formats]
+        self.algorithm = algorithm
+        self.workers = max(1, workers)
+        self.chunk_size = chunk_size
+        self.cache = cache
 
-    def scan(self) -> List[AudioFile]:
-        """Return a list of :class:`AudioFile` instances found beneath ``root``."""
+    def iter_paths(self) -> Iterator[Path]:
+        """Yield paths of supported audio files beneath ``root`` without hashing."""
 
-        audio_files: List[AudioFile] = []
         for path in self.root.rglob("*"):
             if path.is_file() and path.suffix.lower() in self.formats:
-                parent = path.parent.name
-                audio_files.append(
-                    AudioFile(
-                        name=path.name,
-                        parent=parent,
-                        path=path,
-                        extension=path.suffix.lower(),
-                        filehash=file_hash(path),
-                    )
-                )
-        return audio_files
+                yield path
+
+    def scan(
+        self,
+        instrumentation: Optional["ScanInstrumentation"] = None,
+        known: Optional[KnownFiles] = None,
+    ) -> List[AudioFile]:
+        """Return a list of :class:`AudioFile` instances found beneath ``root``.
+
+        See :meth:`iter_files` for the parameters.
+        """
+
+        return list(self.iter_files(instrumentation=instrumentation, known=known))
+
+    def iter_files(
+        self,
+        instrumentation: Optional["ScanInstrumentation"] = None,
+        known: Optional[KnownFiles] = None,
+    ) -> Iterator[AudioFile]:
+        """Yield an :class:`AudioFile` for each audio file beneath ``root``.
+
+        Parameters
+        ----------
+        instrumentation:
+            Optional :class:`instrumentation.ScanInstrumentation` receiving
+            walk/hash timings and per-file progress.
+        known:
+            Mapping of path to ``(size, mtime_ns, filehash)`` as returned by
+            :meth:`AudioRepository.known_files`.  Files whose size and
+            modification time are unchanged reuse the stored hash instead of
+            being read again.
+        """
+
+        if instrumentation is None:
+            entries: Iterable = ((path, path.stat()) for path in self.iter_paths())
+        else:
+            with instrumentation.phase("walk"):
+                entries = [(path, path.stat()) for path in self.iter_paths()]
+            instrumentation.begin(len(entries), sum(st.st_size for _, st in entries))
+
+        def hash_entry(entry):
+            path, st = entry
+            start = time.perf_counter()
+            return self._audio_file(path, st, known), time.perf_counter() - start
+
+        if self.workers == 1:
+            results = map(hash_entry, entries)
+            yield from self._drain(results, instrumentation)
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(self.workers) as pool:
+                results = _bounded_map(pool, hash_entry, entries, self.workers * 4)
+                yield from self._drain(results, instrumentation)
+
+    @staticmethod
+    def _drain(results: Iterator, instrumentation: Optional["ScanInstrumentation"]) -> Iterator[AudioFile]:
+        if instrumentation is None:
+            for audio_file, _ in results:
+                yield audio_file
+            return
+        clock = instrumentation.clock
+        start = clock()
+        for audio_file, seconds in results:
+            instrumentation.add_time("hash", clock() - start)
+            instrumentation.file_done(audio_file.path, audio_file.size, seconds)
+            yield audio_file
+            start = clock()
+        instrumentation.add_time("hash", clock() - start)
+        instrumentation.end()
+
+    def _audio_file(self, path: Path, st: os.stat_result, known: Optional[KnownFiles] = None) -> AudioFile:
+        previous = known.get(str(path)) if known else None
+        if previous is not None and previous[0] == st.st_size and previous[1] == st.st_mtime_ns:
+            digest = previous[2]
+        else:
+            digest = self.cache.get(st, self.algorithm) if self.cache is not None else None
+            if digest is None:
+                digest = file_hash(path, self.chunk_size, self.algorithm)
+                if self.cache is not None:
+                    self.cache.put(st, self.algorithm, digest)
+        return AudioFile(
+            name=path.name,
+            parent=path.parent.name,
+            path=path,
+            extension=path.suffix.lower(),
+            filehash=digest,
+            size=st.st_size,
+            mtime_ns=st.st_mtime_ns,
+        )
 
 
 class AudioRepository:
-    """Persist ``AudioFile`` objects in an SQLite database."""
+    """Persist ``AudioFile`` objects in an SQLite database.
+
+    Parameters
+    ----------
+    db_path:
+        Location of the SQLite database.
+    wal:
+        Switch the database to write-ahead logging so readers do not block
+        the writer.  WAL needs a local file system; leave it off for
+        databases on network shares.
+    """
+
+    # Columns added after the original five; ``create_schema`` adds them to
+    # databases created by earlier versions.
+    EXTRA_COLUMNS = {
+        "size": "INTEGER",
+        "mtime_ns": "INTEGER",
+        "last_verified": "REAL",
+        "verify_status": "TEXT",
+    }
 
-    def __init__(self, db_path: Path) -> None:
+    def __init__(self, db_path: Path, wal: bool = False) -> None:
         self.db_path = Path(db_path)
+        self.wal = wal
         self.conn: sqlite3.Connection | None = None
 
     def __enter__(self) -> "AudioRepository":
         self.conn = sqlite3.connect(self.db_path)
         self.conn.row_factory = sqlite3.Row
+        if self.wal:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
         return self
 
     def __exit__(self, exc_type, exc, tb) -> None:
@@ -105,12 +311,26 @@ class AudioRepository:
                     parent TEXT,
                     path TEXT PRIMARY KEY,
                     extension TEXT,
-                    filehash TEXT
+                    filehash TEXT,
+                    size INTEGER,
+                    mtime_ns INTEGER,
+                    last_verified REAL,
+                    verify_status TEXT
                 )
                 """
             )
+            existing = {row[1] for row in self.conn.execute("PRAGMA table_info(audiofiles)")}
+            for column, kind in self.EXTRA_COLUMNS.items():
+                if column not in existing:
+                    self.conn.execute(f"ALTER TABLE audiofiles ADD COLUMN {column} {kind}")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_audiofiles_filehash ON audiofiles(filehash)")
 
-    def add_files(self, files: Iterable[AudioFile], overwrite: bool = False) -> None:
+    def add_files(
+        self,
+        files: Iterable[AudioFile],
+        overwrite: bool = False,
+        instrumentation: Optional["ScanInstrumentation"] = None,
+    ) -> None:
         """Insert ``files`` into the database.
 
         Parameters
@@ -120,34 +340,156 @@ class AudioRepository:
         overwrite:
             If ``True``, existing rows with matching paths will be replaced.
             Otherwise, duplicates are ignored.
+        instrumentation:
+            Optional :class:`instrumentation.ScanInstrumentation`; the insert
+            is timed as its ``insert`` phase.
         """
 
+        assert self.conn is not None, "Database connection is not initialised"
+        verb = "REPLACE" if overwrite else "INSERT OR IGNORE"
+        sql = (
+            f"{verb} INTO audiofiles (name, parent, path, extension, filehash, size, mtime_ns) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)"
+        )
+        rows = (
+            (f.name, f.parent, str(f.path), f.extension, f.filehash, f.size, f.mtime_ns)
+            for f in files
+        )
+        if instrumentation is None:
+            with self.conn:
+                self.conn.executemany(sql, rows)
+            return
+        with instrumentation.phase("insert"), self.conn:
+            self.conn.executemany(sql, rows)
+
+    def known_files(self, root: Path) -> KnownFiles:
+        """Return ``path -> (size, mtime_ns, filehash)`` for files beneath ``root``."""
+
+        assert self.conn is not None, "Database connection is not initialised"
+        cur = self.conn.execute(
+            "SELECT path, size, mtime_ns, filehash FROM audiofiles WHERE path >= ? AND path < ?",
+            path_range(root),
+        )
+        return {path: (size, mtime_ns, digest) for path, size, mtime_ns, digest in cur}
+
+    def delete_paths(self, paths: Iterable[str]) -> None:
+        """Remove the rows for ``paths``."""
+
         assert self.conn is not None, "Database connection is not initialised"
         with self.conn:
-            for f in files:
-                if overwrite:
-                    self.conn.execute(
-                        "REPLACE INTO audiofiles VALUES (?, ?, ?, ?, ?)",
-                        (f.name, f.parent, str(f.path), f.extension, f.filehash),
-                    )
-                else:
-                    self.conn.execute(
-                        "INSERT OR IGNORE INTO audiofiles VALUES (?, ?, ?, ?, ?)",
-                        (f.name, f.parent, str(f.path), f.extension, f.filehash),
-                    )
+            self.conn.executemany("DELETE FROM audiofiles WHERE path = ?", ((p,) for p in paths))
+
+    def find_by_hash(self, filehash: str) -> List[sqlite3.Row]:
+        """Return all rows whose content hash equals ``filehash``."""
+
+        assert self.conn is not None, "Database connection is not initialised"
+        return self.conn.execute(
+            "SELECT * FROM audiofiles WHERE filehash = ? ORDER BY path", (filehash,)
+        ).fetchall()
+
+    def search_paths(self, text: str, limit: Optional[int] = None) -> List[sqlite3.Row]:
+        """Return rows whose path contains ``text`` (case-insensitive for ASCII)."""
+
+        assert self.conn is not None, "Database connection is not initialised"
+        pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return self.conn.execute(
+            "SELECT * FROM audiofiles WHERE path LIKE ? ESCAPE '\\' ORDER BY path LIMIT ?",
+            (pattern, -1 if limit is None else limit),
+        ).fetchall()
+
+    def duplicates(self, min_copies: int = 2) -> Iterator[Tuple[str, List[str]]]:
+        """Yield ``(filehash, paths)`` for content stored at least ``min_copies`` times."""
+
+        assert self.conn is not None, "Database connection is not initialised"
+        cur = self.conn.execute(
+            """
+            SELECT filehash, path FROM audiofiles
+            WHERE filehash IN (
+                SELECT filehash FROM audiofiles GROUP BY filehash HAVING COUNT(*) >= ?
+            )
+            ORDER BY filehash, path
+            """,
+            (min_copies,),
+        )
+        for digest, rows in groupby(cur, key=itemgetter(0)):
+            yield digest, [row[1] for row in rows]
 
 
 class AudioInventory:
-    """Convenience facade combining scanning and database persistence."""
+    """Convenience facade combining scanning and database persistence.
 
-    def __init__(self, root: Path, db_path: Path, formats: Iterable[str] = DEFAULT_FORMATS) -> None:
-        self.scanner = AudioScanner(root, formats=formats)
+    ``wal`` is passed on to :class:`AudioRepository`; extra keyword arguments
+    (``algorithm``, ``workers``, ``chunk_size``, ``cache``) are passed on to
+    :class:`AudioScanner`.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        db_path: Path,
+        formats: Iterable[str] = DEFAULT_FORMATS,
+        wal: bool = False,
+        **scanner_options,
+    ) -> None:
+        self.scanner = AudioScanner(root, formats=formats, **scanner_options)
         self.db_path = Path(db_path)
+        self.wal = wal
+
+    def run(
+        self,
+        overwrite: bool = False,
+        instrumentation: Optional["ScanInstrumentation"] = None,
+        batch_size: int = 1000,
+        incremental: bool = False,
+        prune: bool = False,
+    ) -> "ScanReport":
+        """Scan ``root``, store results in ``db_path`` and return a report.
+
+        Parameters
+        ----------
+        overwrite:
+            Replace rows for paths that are already stored.
+        instrumentation:
+            Optional :class:`instrumentation.ScanInstrumentation`.  Without
+            one the tree is streamed straight into the database and the
+            report only carries file and byte counts and the total time.
+        batch_size:
+            Number of files inserted and committed per transaction.  Committed
+            batches survive an interrupted scan, so a later incremental run
+            resumes where it stopped.
+        incremental:
+            Reuse stored hashes of files whose size and modification time are
+            unchanged and only write new or modified files.
+        prune:
+            Delete rows beneath ``root`` whose files no longer exist.
+        """
 
-    def run(self, overwrite: bool = False) -> None:
-        """Scan ``root`` and store results in ``db_path``."""
+        from instrumentation import ScanReport
 
-        files = self.scanner.scan()
-        with AudioRepository(self.db_path) as repo:
+        root = self.scanner.root
+        start = time.perf_counter()
+        files = nbytes = 0
+        with AudioRepository(self.db_path, wal=self.wal) as repo:
             repo.create_schema()
-            repo.add_files(files, overwrite=overwrite)
+            known = repo.known_files(root) if incremental else None
+            seen: set = set()
+            batch: List[AudioFile] = []
+            for f in self.scanner.iter_files(instrumentation=instrumentation, known=known):
+                files += 1
+                nbytes += f.size
+                key = str(f.path)
+                seen.add(key)
+                if known is not None and known.get(key) == (f.size, f.mtime_ns, f.filehash):
+                    continue
+                batch.append(f)
+                if len(batch) >= batch_size:
+                    repo.add_files(batch, overwrite=overwrite or incremental, instrumentation=instrumentation)
+                    batch = []
+            if batch:
+                repo.add_files(batch, overwrite=overwrite or incremental, instrumentation=instrumentation)
+            if prune:
+                stored = known if known is not None else repo.known_files(root)
+                repo.delete_paths(set(stored) - seen)
+        if instrumentation is not None:
+            return instrumentation.report(root)
+        return ScanReport(root=str(root), files=files, bytes=nbytes, phases={"total": time.perf_counter() - start})
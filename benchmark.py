@@ -0,0 +1,340 @@
+from __future__ import annotations
+
+"""Benchmark harness for scanning, hashing and database ingest.
+
+The harness generates a synthetic audio library in a temporary directory and
+times the individual phases of an inventory run separately:
+
+``walk``
+    Discovering and stat'ing audio files.
+``hash``
+    Hashing them with the algorithm, worker count and chunk size from
+    :class:`LibrarySpec`.
+
+    Both come from a single :meth:`AudioScanner.iter_files` pass, the code
+    path an inventory run uses, split by a
+    :class:`instrumentation.ScanInstrumentation`.
+``insert``
+    Storing the resulting :class:`AudioFile` objects through
+    :meth:`AudioRepository.add_files`.
+``gd_insert``
+    Populating a :class:`GratefulDeadDB` with synthetic shows and recordings.
+
+Each phase records its wall time, throughput and, on Linux, its own peak
+resident set size (the high-water mark is reset through
+``/proc/self/clear_refs`` before each phase).  Elsewhere phases report
+``None`` and only the peak of the whole run is given.
+
+Results are returned as plain dictionaries and can be written to JSON so runs
+from different commits can be compared with :func:`compare_results`.
+"""
+
+from dataclasses import asdict, dataclass
+from pathlib import Path
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from audio_inventory import (
+    DEFAULT_FORMATS,
+    HASH_ALGORITHMS,
+    HASH_CHUNK_SIZE,
+    AudioRepository,
+    AudioScanner,
+)
+from grateful_dead import GratefulDeadDB, Recording, Show
+from instrumentation import ScanInstrumentation
+
+SIZE_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+
+@dataclass
+class LibrarySpec:
+    """Parameters describing a synthetic audio library and how it is scanned."""
+
+    file_count: int = 1000
+    mean_size: int = 64 * 1024  # bytes
+    size_distribution: str = "lognormal"
+    depth: int = 3
+    fanout: int = 8
+    duplicate_ratio: float = 0.1
+    seed: int = 0
+    # Passed to AudioScanner for the hash phase.
+    algorithm: str = "sha1"
+    workers: int = 1
+    chunk_size: int = HASH_CHUNK_SIZE
+
+
+def _draw_size(rng: random.Random, spec: LibrarySpec) -> int:
+    if spec.size_distribution == "fixed":
+        return spec.mean_size
+    if spec.size_distribution == "uniform":
+        return rng.randint(0, 2 * spec.mean_size)
+    if spec.size_distribution == "lognormal":
+        # sigma=1 gives a long tail similar to a mix of short and long tracks;
+        # mu=-sigma**2/2 makes the mean of the multiplier exactly 1.
+        return int(rng.lognormvariate(-0.5, 1.0) * spec.mean_size)
+    raise ValueError(f"Unknown size distribution: {spec.size_distribution}")
+
+
+def generate_library(root: Path, spec: LibrarySpec) -> int:
+    """Create a synthetic library beneath ``root`` according to ``spec``.
+
+    Files are spread over a directory tree ``spec.depth`` levels deep with at
+    most ``spec.fanout`` subdirectories per level.  A fraction
+    ``spec.duplicate_ratio`` of the files are byte-for-byte copies of earlier
+    files so duplicate detection has something to find.
+
+    Returns the total number of bytes written.
+    """
+
+    if spec.size_distribution not in SIZE_DISTRIBUTIONS:
+        raise ValueError(f"Unknown size distribution: {spec.size_distribution}")
+
+    rng = random.Random(spec.seed)
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    written: List[Path] = []
+    total_bytes = 0
+    for i in range(spec.file_count):
+        parts = [f"d{rng.randrange(spec.fanout)}" for _ in range(rng.randint(1, max(spec.depth, 1)))]
+        directory = root.joinpath(*parts)
+        directory.mkdir(parents=True, exist_ok=True)
+        target = directory / f"track{i:07d}{DEFAULT_FORMATS[i % len(DEFAULT_FORMATS)]}"
+        if written and rng.random() < spec.duplicate_ratio:
+            data = rng.choice(written).read_bytes()
+        else:
+            data = rng.randbytes(_draw_size(rng, spec))
+        target.write_bytes(data)
+        written.append(target)
+        total_bytes += len(data)
+    return total_bytes
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Return the peak resident set size over the lifetime of this process, if available."""
+
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def reset_phase_peak_rss() -> bool:
+    """Reset the kernel's RSS high-water mark; return ``False`` where unsupported."""
+
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def phase_peak_rss_bytes() -> Optional[int]:
+    """Return the RSS high-water mark since :func:`reset_phase_peak_rss`, if available."""
+
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class _PhaseMemory(ScanInstrumentation):
+    """Instrumentation that splits the peak RSS between walk and hash."""
+
+    def __init__(self, track_memory: bool) -> None:
+        super().__init__(slow_file_seconds=None)
+        self.track_memory = track_memory
+        self.walk_peak_rss: Optional[int] = None
+
+    def begin(self, files_total: int, bytes_total: int) -> None:
+        # Called once the walk has finished and before hashing starts.
+        if self.track_memory:
+            self.walk_peak_rss = phase_peak_rss_bytes()
+            reset_phase_peak_rss()
+        super().begin(files_total, bytes_total)
+
+
+def _phase(name: str, seconds: float, files: int, nbytes: int, peak_rss: Optional[int]) -> Dict[str, object]:
+    return {
+        "phase": name,
+        "seconds": seconds,
+        "files": files,
+        "bytes": nbytes,
+        "files_per_s": files / seconds if seconds > 0 else None,
+        "mb_per_s": nbytes / 1e6 / seconds if seconds > 0 and nbytes else None,
+        "peak_rss_bytes": peak_rss,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run_benchmark(spec: LibrarySpec, workdir: Optional[Path] = None, gd_shows: int = 500) -> Dict[str, object]:
+    """Generate a library and time the walk, hash and insert phases.
+
+    Parameters
+    ----------
+    spec:
+        Description of the synthetic library to generate.
+    workdir:
+        Directory in which to create the library and databases.  A temporary
+        directory is used and removed afterwards when omitted.
+    gd_shows:
+        Number of synthetic shows inserted into :class:`GratefulDeadDB`.  Each
+        show gets two recordings.  Use ``0`` to skip this phase.
+    """
+
+    if workdir is None:
+        with tempfile.TemporaryDirectory(prefix="py_inv_bench_") as tmp:
+            return run_benchmark(spec, Path(tmp), gd_shows=gd_shows)
+
+    workdir = Path(workdir)
+    library = workdir / "library"
+    total_bytes = generate_library(library, spec)
+
+    phases: List[Dict[str, object]] = []
+    track_memory = reset_phase_peak_rss()
+
+    def peak() -> Optional[int]:
+        return phase_peak_rss_bytes() if track_memory else None
+
+    scanner = AudioScanner(library, algorithm=spec.algorithm, workers=spec.workers, chunk_size=spec.chunk_size)
+    instrumentation = _PhaseMemory(track_memory)
+    files = list(scanner.iter_files(instrumentation=instrumentation))
+    phases.append(
+        _phase(
+            "walk",
+            instrumentation.phases["walk"],
+            instrumentation.files_total,
+            0,
+            instrumentation.walk_peak_rss,
+        )
+    )
+    phases.append(_phase("hash", instrumentation.phases["hash"], len(files), instrumentation.bytes_done, peak()))
+
+    if track_memory:
+        reset_phase_peak_rss()
+    start = time.perf_counter()
+    with AudioRepository(workdir / "audio.db") as repo:
+        repo.create_schema()
+        repo.add_files(files)
+    phases.append(_phase("insert", time.perf_counter() - start, len(files), 0, peak()))
+
+    if gd_shows:
+        first = datetime.date(1965, 1, 1)
+        shows = [
+            Show(date=(first + datetime.timedelta(days=i)).isoformat(), venue=f"Venue {i}")
+            for i in range(gd_shows)
+        ]
+        recordings = [Recording(date=s.date, source=src) for s in shows for src in ("SBD", "AUD")]
+        db = GratefulDeadDB(workdir / "gd.db")
+        db.init_schema()
+        if track_memory:
+            reset_phase_peak_rss()
+        start = time.perf_counter()
+        for show in shows:
+            db.add_show(show)
+        for recording in recordings:
+            db.add_recording(recording)
+        phases.append(_phase("gd_insert", time.perf_counter() - start, len(shows) + len(recordings), 0, peak()))
+
+    return {
+        "spec": asdict(spec),
+        "total_bytes": total_bytes,
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "phases": phases,
+    }
+
+
+def compare_results(baseline: Dict[str, object], current: Dict[str, object]) -> Dict[str, Optional[float]]:
+    """Return ``current / baseline`` wall-time ratios for each shared phase.
+
+    A ratio below ``1.0`` means the phase became faster.
+    """
+
+    base = {p["phase"]: p for p in baseline["phases"]}
+    ratios: Dict[str, Optional[float]] = {}
+    for phase in current["phases"]:
+        old = base.get(phase["phase"])
+        if old is None:
+            continue
+        ratios[phase["phase"]] = phase["seconds"] / old["seconds"] if old["seconds"] else None
+    return ratios
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark scanning, hashing and database ingest.")
+    parser.add_argument("--files", type=int, default=LibrarySpec.file_count, help="number of files to generate")
+    parser.add_argument("--mean-size", type=int, default=LibrarySpec.mean_size, help="mean file size in bytes")
+    parser.add_argument("--size-distribution", choices=SIZE_DISTRIBUTIONS, default=LibrarySpec.size_distribution)
+    parser.add_argument("--depth", type=int, default=LibrarySpec.depth, help="maximum directory depth")
+    parser.add_argument("--fanout", type=int, default=LibrarySpec.fanout, help="subdirectories per level")
+    parser.add_argument("--duplicate-ratio", type=float, default=LibrarySpec.duplicate_ratio)
+    parser.add_argument("--seed", type=int, default=LibrarySpec.seed)
+    parser.add_argument("--hash-algorithm", choices=HASH_ALGORITHMS, default=LibrarySpec.algorithm)
+    parser.add_argument("--workers", type=int, default=LibrarySpec.workers, help="hashing threads")
+    parser.add_argument("--chunk-size", type=int, default=LibrarySpec.chunk_size, help="hash read size in bytes")
+    parser.add_argument("--gd-shows", type=int, default=500, help="synthetic shows for the GratefulDeadDB phase")
+    parser.add_argument("--output", type=Path, help="write results as JSON to this file")
+    parser.add_argument("--compare", type=Path, help="JSON results of a previous run to compare against")
+    args = parser.parse_args(argv)
+
+    spec = LibrarySpec(
+        file_count=args.files,
+        mean_size=args.mean_size,
+        size_distribution=args.size_distribution,
+        depth=args.depth,
+        fanout=args.fanout,
+        duplicate_ratio=args.duplicate_ratio,
+        seed=args.seed,
+        algorithm=args.hash_algorithm,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+    )
+    result = run_benchmark(spec, gd_shows=args.gd_shows)
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text())
+        result["compared_to"] = baseline.get("commit")
+        result["ratios"] = compare_results(baseline, result)
+
+    text = json.dumps(result, indent=2)
+    if args.output is not None:
+        args.output.write_text(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
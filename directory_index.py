@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+"""Parent-linked index of directory trees with recursive size totals.
+
+:class:`DirectoryIndex` replaces ``inv_comps_v0.DirectoryInventory``.  Each
+directory becomes one row of the ``directory_tree`` table holding its
+``parent_id``, its own name, the number and size of the files directly inside
+it and the recursive totals of its whole subtree.  The tree is built in a
+single streaming :func:`os.scandir` pass: directories are written in
+post-order, once all of their children are known, using batched
+``executemany`` inserts into a temporary staging table, so memory use is
+bounded by the depth of the tree rather than its size.  The staged tree
+replaces the stored one in a single short transaction at the end.
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+import os
+import sqlite3
+import time
+from typing import List, Optional
+
+
+@dataclass(frozen=True)
+class DirectoryNode:
+    """A directory stored in the index."""
+
+    id: int
+    parent_id: Optional[int]
+    name: str
+    depth: int  # 0 for the indexed root
+    file_count: int  # files directly inside this directory
+    file_bytes: int
+    total_files: int  # files in the whole subtree
+    total_bytes: int
+    path: str
+
+
+class _Frame:
+    """A directory whose entries are still being read."""
+
+    __slots__ = ("entries", "id", "parent_id", "name", "depth", "file_count", "file_bytes", "total_files", "total_bytes")
+
+    def __init__(self, entries, id: int, parent_id: Optional[int], name: str, depth: int) -> None:
+        self.entries = entries
+        self.id = id
+        self.parent_id = parent_id
+        self.name = name
+        self.depth = depth
+        self.file_count = 0
+        self.file_bytes = 0
+        self.total_files = 0
+        self.total_bytes = 0
+
+
+def _open(path: str):
+    try:
+        return os.scandir(path)
+    except OSError:
+        # Unreadable directories are still indexed, just without contents.
+        return iter(())
+
+
+class DirectoryIndex:
+    """SQLite-backed index of one or more directory trees."""
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = Path(db_path)
+
+    def init_schema(self) -> None:
+        """Create the index tables if they do not already exist."""
+
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS directory_roots (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    path TEXT UNIQUE,
+                    dir_id INTEGER,
+                    scanned_at REAL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS directory_tree (
+                    id INTEGER PRIMARY KEY,
+                    parent_id INTEGER REFERENCES directory_tree(id),
+                    root_id INTEGER REFERENCES directory_roots(id),
+                    name TEXT,
+                    depth INTEGER,
+                    file_count INTEGER,
+                    file_bytes INTEGER,
+                    total_files INTEGER,
+                    total_bytes INTEGER
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_directory_tree_parent ON directory_tree(parent_id)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_directory_tree_size ON directory_tree(root_id, total_bytes DESC)"
+            )
+
+    def build(self, root: Path, batch_size: int = 5000) -> int:
+        """Index the tree beneath ``root``, replacing any previous index of it.
+
+        ``root`` is resolved to an absolute path, as the scanner does.  The
+        walk writes into a temporary staging table, so the database itself
+        is only locked for the short transaction that swaps the new tree in;
+        scans into the same database can run while a drive is being indexed.
+
+        Returns the number of directories stored.
+        """
+
+        root_path = str(Path(root).resolve())
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute("DROP TABLE IF EXISTS temp.directory_staging")
+            conn.execute(
+                """
+                CREATE TEMP TABLE directory_staging (
+                    id INTEGER PRIMARY KEY,
+                    parent_id INTEGER,
+                    name TEXT,
+                    depth INTEGER,
+                    file_count INTEGER,
+                    file_bytes INTEGER,
+                    total_files INTEGER,
+                    total_bytes INTEGER
+                )
+                """
+            )
+            insert = (
+                "INSERT INTO temp.directory_staging(id, parent_id, name, depth, file_count, "
+                "file_bytes, total_files, total_bytes) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+            )
+            # Staging ids start at 1 and are shifted past the existing ids
+            # when the tree is swapped in.
+            next_id = 1
+            stack = [_Frame(_open(root_path), next_id, None, root_path, 0)]
+            pending: list = []
+            count = 0
+            while stack:
+                top = stack[-1]
+                entry = next(top.entries, None)
+                if entry is None:
+                    if hasattr(top.entries, "close"):
+                        top.entries.close()
+                    stack.pop()
+                    top.total_files += top.file_count
+                    top.total_bytes += top.file_bytes
+                    pending.append(
+                        (top.id, top.parent_id, top.name, top.depth, top.file_count,
+                         top.file_bytes, top.total_files, top.total_bytes)
+                    )
+                    if stack:
+                        stack[-1].total_files += top.total_files
+                        stack[-1].total_bytes += top.total_bytes
+                    if len(pending) >= batch_size:
+                        with conn:
+                            conn.executemany(insert, pending)
+                        count += len(pending)
+                        pending = []
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        next_id += 1
+                        stack.append(_Frame(_open(entry.path), next_id, top.id, entry.name, top.depth + 1))
+                    elif entry.is_file(follow_symlinks=False):
+                        top.file_count += 1
+                        top.file_bytes += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+            with conn:
+                conn.executemany(insert, pending)
+            count += len(pending)
+            self._swap_in(conn, root_path)
+            conn.execute("DROP TABLE temp.directory_staging")
+        finally:
+            conn.close()
+        return count
+
+    @staticmethod
+    def _swap_in(conn: sqlite3.Connection, root_path: str) -> None:
+        """Replace the stored tree of ``root_path`` with the staged one in one transaction."""
+
+        # IMMEDIATE so concurrent builds cannot pick overlapping id offsets.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT id FROM directory_roots WHERE path = ?", (root_path,)).fetchone()
+            if row is None:
+                root_id = conn.execute("INSERT INTO directory_roots(path) VALUES (?)", (root_path,)).lastrowid
+            else:
+                (root_id,) = row
+                conn.execute("DELETE FROM directory_tree WHERE root_id = ?", (root_id,))
+            (offset,) = conn.execute("SELECT COALESCE(MAX(id), 0) FROM directory_tree").fetchone()
+            conn.execute(
+                """
+                INSERT INTO directory_tree(id, parent_id, root_id, name, depth, file_count,
+                                           file_bytes, total_files, total_bytes)
+                SELECT id + ?, parent_id + ?, ?, name, depth, file_count, file_bytes, total_files, total_bytes
+                FROM temp.directory_staging
+                """,
+                (offset, offset, root_id),
+            )
+            conn.execute(
+                "UPDATE directory_roots SET dir_id = ?, scanned_at = ? WHERE id = ?",
+                (offset + 1, time.time(), root_id),
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def roots(self) -> List[str]:
+        """Return the paths of all indexed roots."""
+
+        with sqlite3.connect(self.db_path) as conn:
+            return [path for (path,) in conn.execute("SELECT path FROM directory_roots ORDER BY path")]
+
+    def largest_subtrees(
+        self,
+        root: Path,
+        limit: int = 20,
+        depth: Optional[int] = None,
+    ) -> List[DirectoryNode]:
+        """Return the ``limit`` largest directories beneath ``root`` by total bytes.
+
+        Parameters
+        ----------
+        root:
+            A root previously passed to :meth:`build`; resolved the same way.
+        limit:
+            Maximum number of directories to return.
+        depth:
+            Only consider directories at exactly this depth below ``root``
+            (``1`` for its immediate children).  By default every directory
+            except the root itself is considered, so nested directories can
+            appear alongside their parents.
+        """
+
+        sql = (
+            "SELECT t.id FROM directory_tree t JOIN directory_roots r ON t.root_id = r.id "
+            "WHERE r.path = ? AND t.depth {} ? ORDER BY t.total_bytes DESC LIMIT ?"
+        ).format(">=" if depth is None else "=")
+        with sqlite3.connect(self.db_path) as conn:
+            ids = [i for (i,) in conn.execute(sql, (str(Path(root).resolve()), 1 if depth is None else depth, limit))]
+            return [self._node(conn, i) for i in ids]
+
+    def children(self, dir_id: int) -> List[DirectoryNode]:
+        """Return the subdirectories of ``dir_id``, largest first."""
+
+        with sqlite3.connect(self.db_path) as conn:
+            ids = conn.execute(
+                "SELECT id FROM directory_tree WHERE parent_id = ? ORDER BY total_bytes DESC", (dir_id,)
+            ).fetchall()
+            return [self._node(conn, i) for (i,) in ids]
+
+    def node(self, dir_id: int) -> DirectoryNode:
+        """Return the directory with id ``dir_id``."""
+
+        with sqlite3.connect(self.db_path) as conn:
+            return self._node(conn, dir_id)
+
+    @staticmethod
+    def _node(conn: sqlite3.Connection, dir_id: int) -> DirectoryNode:
+        rows = conn.execute(
+            """
+            WITH RECURSIVE ancestry(id, parent_id, name, depth) AS (
+                SELECT id, parent_id, name, depth FROM directory_tree WHERE id = ?
+                UNION ALL
+                SELECT t.id, t.parent_id, t.name, t.depth
+                FROM directory_tree t JOIN ancestry a ON t.id = a.parent_id
+            )
+            SELECT name FROM ancestry ORDER BY depth
+            """,
+            (dir_id,),
+        ).fetchall()
+        if not rows:
+            raise KeyError(dir_id)
+        path = os.path.join(*(name for (name,) in rows))
+        row = conn.execute(
+            "SELECT id, parent_id, name, depth, file_count, file_bytes, total_files, total_bytes "
+            "FROM directory_tree WHERE id = ?",
+            (dir_id,),
+        ).fetchone()
+        return DirectoryNode(*row, path=path)
@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+"""Streaming export and import of inventory tables.
+
+:func:`export_table` reads a table in record batches with
+``cursor.fetchmany`` and writes each batch straight to Parquet (through
+:mod:`pyarrow`, when installed) or to JSON lines, optionally compressed with
+gzip or zstd (through :mod:`zstandard`, when installed).  Column projection
+and filters are translated into the ``SELECT`` so SQLite only returns the
+requested data; nothing is materialised as :class:`sqlite3.Row` objects or
+held in memory beyond one batch.  :func:`import_table` reads the same formats
+back and inserts them with one ``executemany`` per batch.
+
+The format is chosen from the file name: ``.parquet``, ``.jsonl``,
+``.jsonl.gz`` or ``.jsonl.zst``.
+"""
+
+from pathlib import Path
+import gzip
+import io
+import json
+import sqlite3
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+# (column, operator, value) triples combined with AND.
+Filter = Tuple[str, str, Any]
+
+FORMATS = ("parquet", "jsonl", "jsonl.gz", "jsonl.zst")
+OPERATORS = ("=", "!=", "<", "<=", ">", ">=", "like", "in", "is null", "is not null")
+DEFAULT_BATCH_SIZE = 50_000
+
+# Compression levels chosen for throughput rather than ratio.
+GZIP_LEVEL = 1
+ZSTD_LEVEL = 3
+
+
+def detect_format(path: Path) -> str:
+    """Return the export format implied by ``path``'s suffixes."""
+
+    name = Path(path).name.lower()
+    for fmt in sorted(FORMATS, key=len, reverse=True):
+        if name.endswith("." + fmt):
+            return fmt
+    raise ValueError(f"Cannot infer export format from {path}; use one of {', '.join(FORMATS)}")
+
+
+def _table_columns(conn: sqlite3.Connection, table: str) -> List[Tuple[str, str]]:
+    info = conn.execute("SELECT name, type FROM pragma_table_info(?)", (table,))
+    columns = [(name, (declared or "").upper()) for name, declared in info]
+    if not columns:
+        raise ValueError(f"Unknown table: {table}")
+    return columns
+
+
+def build_query(
+    conn: sqlite3.Connection,
+    table: str,
+    columns: Optional[Sequence[str]] = None,
+    filters: Sequence[Filter] = (),
+) -> Tuple[str, List[Any], List[Tuple[str, str]]]:
+    """Return ``(sql, params, selected columns)`` for a projected, filtered read.
+
+    Column names are checked against the table so they can be safely
+    interpolated; values are always bound as parameters.
+    """
+
+    available = _table_columns(conn, table)
+    types = dict(available)
+    selected = available if not columns else [(c, types[c]) for c in columns if c in types]
+    unknown = [c for c in (columns or []) if c not in types] + [f[0] for f in filters if f[0] not in types]
+    if unknown:
+        raise ValueError(f"Unknown column(s) for {table}: {', '.join(unknown)}")
+
+    clauses: List[str] = []
+    params: List[Any] = []
+    for column, op, value in filters:
+        op = op.lower()
+        if op not in OPERATORS:
+            raise ValueError(f"Unsupported filter operator: {op}")
+        if op in ("is null", "is not null"):
+            clauses.append(f'"{column}" {op.upper()}')
+        elif op == "in":
+            if isinstance(value, (str, bytes)):
+                raise ValueError(f"Filter '{column} in' needs a sequence of values, not {value!r}")
+            values = list(value)
+            clauses.append(f'"{column}" IN ({", ".join("?" * len(values))})')
+            params.extend(values)
+        else:
+            clauses.append(f'"{column}" {op.upper()} ?')
+            params.append(value)
+
+    sql = "SELECT {} FROM \"{}\"".format(", ".join(f'"{c}"' for c, _ in selected), table)
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    return sql, params, selected
+
+
+def _batches(cur: sqlite3.Cursor, batch_size: int) -> Iterator[List[tuple]]:
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def _open_binary(path: Path, fmt: str, mode: str):
+    if fmt == "jsonl.gz":
+        return gzip.open(path, mode + "b", compresslevel=GZIP_LEVEL) if mode == "w" else gzip.open(path, "rb")
+    if fmt == "jsonl.zst":
+        try:
+            import zstandard
+        except ImportError as exc:  # pragma: no cover - depends on environment
+            raise ImportError("zstd compression requires the 'zstandard' package") from exc
+        raw = open(path, mode + "b")
+        if mode == "w":
+            return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw, closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+    return open(path, mode + "b")
+
+
+def _arrow_type(declared: str):
+    import pyarrow as pa
+
+    if "INT" in declared:
+        return pa.int64()
+    if any(t in declared for t in ("REAL", "FLOA", "DOUB")):
+        return pa.float64()
+    if "BLOB" in declared:
+        return pa.binary()
+    return pa.string()
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as exc:  # pragma: no cover - depends on environment
+        raise ImportError("Parquet support requires the 'pyarrow' package") from exc
+    return pyarrow, pyarrow.parquet
+
+
+def export_table(
+    db_path: Path,
+    table: str,
+    dest: Path,
+    columns: Optional[Sequence[str]] = None,
+    filters: Sequence[Filter] = (),
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """Stream ``table`` from ``db_path`` into ``dest``.
+
+    Parameters
+    ----------
+    db_path:
+        SQLite database to read.
+    table:
+        Table to export, e.g. ``audiofiles``, ``shows`` or ``recordings``.
+    dest:
+        Output file; its suffix selects the format (see :func:`detect_format`).
+    columns:
+        Columns to export; all columns by default.
+    filters:
+        ``(column, operator, value)`` triples applied in SQL, e.g.
+        ``[("extension", "=", ".flac"), ("size", ">=", 10**8)]``.
+    batch_size:
+        Rows fetched and written per batch.
+
+    Returns the number of rows written.
+    """
+
+    fmt = detect_format(dest)
+    conn = sqlite3.connect(db_path)
+    try:
+        sql, params, selected = build_query(conn, table, columns, filters)
+        names = [c for c, _ in selected]
+        cur = conn.execute(sql, params)
+        if fmt == "parquet":
+            return _write_parquet(cur, dest, selected, batch_size)
+        count = 0
+        dumps = json.JSONEncoder(ensure_ascii=False, check_circular=False).encode
+        with _open_binary(dest, fmt, "w") as out:
+            for rows in _batches(cur, batch_size):
+                out.write("".join(dumps(dict(zip(names, row))) + "\n" for row in rows).encode("utf-8"))
+                count += len(rows)
+        return count
+    finally:
+        conn.close()
+
+
+def _write_parquet(cur: sqlite3.Cursor, dest: Path, selected: List[Tuple[str, str]], batch_size: int) -> int:
+    pa, pq = _import_pyarrow()
+    schema = pa.schema([(name, _arrow_type(declared)) for name, declared in selected])
+    count = 0
+    with pq.ParquetWriter(str(dest), schema) as writer:
+        for rows in _batches(cur, batch_size):
+            arrays = [pa.array(list(values), type=field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            count += len(rows)
+    return count
+
+
+def _read_batches(src: Path, batch_size: int) -> Iterator[Tuple[List[str], List[tuple]]]:
+    fmt = detect_format(src)
+    if fmt == "parquet":
+        _, pq = _import_pyarrow()
+        for batch in pq.ParquetFile(str(src)).iter_batches(batch_size=batch_size):
+            names = batch.schema.names
+            yield names, list(zip(*(column.to_pylist() for column in batch.columns)))
+        return
+
+    with _open_binary(src, fmt, "r") as raw:
+        names: Optional[List[str]] = None
+        rows: List[tuple] = []
+        for line in io.TextIOWrapper(raw, encoding="utf-8"):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if names is None:
+                names = list(record)
+            rows.append(tuple(record.get(n) for n in names))
+            if len(rows) >= batch_size:
+                yield names, rows
+                rows = []
+        if rows and names is not None:
+            yield names, rows
+
+
+def _ensure_table(conn: sqlite3.Connection, db_path: Path, table: str) -> None:
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone():
+        return
+    if table == "audiofiles":
+        from audio_inventory import AudioRepository
+
+        with AudioRepository(db_path) as repo:
+            repo.create_schema()
+    elif table in ("shows", "recordings", "archive_shows"):
+        from grateful_dead import GratefulDeadDB
+
+        GratefulDeadDB(db_path).init_schema()
+    else:
+        raise ValueError(f"Table {table} does not exist in {db_path}")
+
+
+def import_table(
+    db_path: Path,
+    table: str,
+    src: Path,
+    replace: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """Load a file written by :func:`export_table` into ``table``.
+
+    The inventory and Grateful Dead tables are created if missing.  Rows
+    whose key already exists are skipped, or replaced when ``replace`` is
+    true.  Returns the number of rows read.
+    """
+
+    conn = sqlite3.connect(db_path)
+    try:
+        _ensure_table(conn, db_path, table)
+        known = {name for name, _ in _table_columns(conn, table)}
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        count = 0
+        for names, rows in _read_batches(src, batch_size):
+            unknown = [n for n in names if n not in known]
+            if unknown:
+                raise ValueError(f"Unknown column(s) for {table}: {', '.join(unknown)}")
+            sql = '{} INTO "{}" ({}) VALUES ({})'.format(
+                verb, table, ", ".join(f'"{n}"' for n in names), ", ".join("?" * len(names))
+            )
+            with conn:
+                conn.executemany(sql, rows)
+            count += len(rows)
+        return count
+    finally:
+        conn.close()
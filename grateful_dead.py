@@ -12,7 +12,10 @@ from dataclasses import dataclass
 from pathlib import Path
 import csv
 import sqlite3
-from typing import Iterable, List
+from typing import TYPE_CHECKING, Iterable, List
+
+if TYPE_CHECKING:
+    from archive_scanner import ArchiveShow
 
 
 @dataclass(frozen=True)
@@ -60,6 +63,14 @@ class GratefulDeadDB:
                 )
                 """
             )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS archive_shows (
+                    identifier TEXT PRIMARY KEY,
+                    title TEXT
+                )
+                """
+            )
 
     def add_show(self, show: Show) -> None:
         """Insert a show into the database."""
@@ -84,6 +95,15 @@ class GratefulDeadDB:
                 (show_id, recording.source),
             )
 
+    def add_archive_shows(self, shows: Iterable["ArchiveShow"]) -> None:
+        """Insert or update Internet Archive items (see :mod:`archive_scanner`)."""
+
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany(
+                "REPLACE INTO archive_shows(identifier, title) VALUES (?, ?)",
+                ((s.identifier, s.title) for s in shows),
+            )
+
 
 def load_shows(csv_path: Path) -> List[Show]:
     """Load show information from a CSV file."""
@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+"""Persistent cache of file hashes shared between inventory databases.
+
+Entries are keyed by ``(device id, inode, size, mtime_ns, algorithm)`` so a
+file is only read again when it changes.  The cache is a standalone SQLite
+file in WAL mode: several scanner processes can use it at once, readers never
+wait for writers, and writers only hold the lock for the short batched
+transactions issued by :meth:`HashCache.flush`.  Digests are stored as raw
+bytes and the table has no rowid, keeping each entry small.
+
+When the number of entries exceeds ``max_entries`` the least recently used
+entries are evicted.  The entry count is kept in a ``meta`` row updated in the
+same transactions that add and evict entries, so enforcing the cap never
+counts the whole table.  :meth:`HashCache.export_to` and
+:meth:`HashCache.import_from` move entries between hosts as (optionally
+gzipped) JSON lines.  Device ids are host-specific, so ``import_from`` accepts
+a mapping to translate them.
+"""
+
+from pathlib import Path
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# (dev, ino, size, mtime_ns, algorithm)
+CacheKey = Tuple[int, int, int, int, str]
+
+
+def cache_key(st: os.stat_result, algorithm: str) -> CacheKey:
+    """Return the cache key for a file with stat result ``st``."""
+
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, algorithm)
+
+
+def _open_text(path: Path, mode: str):
+    if Path(path).suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class HashCache:
+    """LRU hash cache stored in an SQLite file.
+
+    Parameters
+    ----------
+    db_path:
+        Location of the cache file.  It is created if necessary.
+    max_entries:
+        Maximum number of entries kept; the least recently used entries are
+        evicted on :meth:`flush` once the cap is exceeded.
+    flush_every:
+        Number of buffered writes after which :meth:`flush` runs
+        automatically.
+    timeout:
+        Seconds to wait for another process holding the write lock.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        max_entries: int = 5_000_000,
+        flush_every: int = 1000,
+        timeout: float = 30.0,
+    ) -> None:
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._pending: Dict[CacheKey, Tuple[bytes, int]] = {}
+        self._touched: Dict[CacheKey, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(self.db_path, timeout=timeout, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS hashes (
+                    dev INTEGER,
+                    ino INTEGER,
+                    size INTEGER,
+                    mtime_ns INTEGER,
+                    algorithm TEXT,
+                    digest BLOB,
+                    last_used INTEGER,
+                    PRIMARY KEY (dev, ino, size, mtime_ns, algorithm)
+                ) WITHOUT ROWID
+                """
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_hashes_last_used ON hashes(last_used)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+            # Re-sync once per open in case an older version or a crashed
+            # process left the stored count behind.
+            self.conn.execute("REPLACE INTO meta VALUES ('entries', (SELECT COUNT(*) FROM hashes))")
+
+    def __enter__(self) -> "HashCache":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Flush buffered writes and close the database."""
+
+        self.flush()
+        self.conn.close()
+
+    def get(self, st: os.stat_result, algorithm: str) -> Optional[str]:
+        """Return the cached hex digest for the file described by ``st``."""
+
+        key = cache_key(st, algorithm)
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                self.hits += 1
+                return pending[0].hex()
+            row = self.conn.execute(
+                "SELECT digest FROM hashes WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ? AND algorithm = ?",
+                key,
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = int(time.time())
+            flush = len(self._touched) >= self.flush_every
+        if flush:
+            self.flush()
+        return row[0].hex()
+
+    def put(self, st: os.stat_result, algorithm: str, hexdigest: str) -> None:
+        """Remember ``hexdigest`` for the file described by ``st``."""
+
+        with self._lock:
+            self._pending[cache_key(st, algorithm)] = (bytes.fromhex(hexdigest), int(time.time()))
+            flush = len(self._pending) >= self.flush_every
+        if flush:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write buffered entries and access times, then enforce ``max_entries``."""
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            touched, self._touched = self._touched, {}
+            if not pending and not touched:
+                return
+            with self.conn:
+                # Insert new keys first so the rowcount tells how many entries
+                # were added, then refresh entries that already existed.
+                added = self.conn.executemany(
+                    "INSERT OR IGNORE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key + value for key, value in pending.items()),
+                ).rowcount
+                self.conn.executemany(
+                    "UPDATE hashes SET digest = ?, last_used = ? "
+                    "WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ? AND algorithm = ?",
+                    (value + key for key, value in pending.items()),
+                )
+                self.conn.executemany(
+                    "UPDATE hashes SET last_used = ? "
+                    "WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ? AND algorithm = ?",
+                    ((used,) + key for key, used in touched.items()),
+                )
+                self._evict(added)
+
+    def _evict(self, added: int) -> None:
+        """Add ``added`` to the stored entry count and evict down to ``max_entries``.
+
+        Must run inside the transaction that inserted the entries.
+        """
+
+        self.conn.execute("UPDATE meta SET value = value + ? WHERE name = 'entries'", (added,))
+        excess = self._count() - self.max_entries
+        if excess > 0:
+            removed = self.conn.execute(
+                """
+                DELETE FROM hashes WHERE (dev, ino, size, mtime_ns, algorithm) IN (
+                    SELECT dev, ino, size, mtime_ns, algorithm FROM hashes ORDER BY last_used LIMIT ?
+                )
+                """,
+                (excess,),
+            ).rowcount
+            self.conn.execute("UPDATE meta SET value = value - ? WHERE name = 'entries'", (removed,))
+
+    def _count(self) -> int:
+        (count,) = self.conn.execute("SELECT value FROM meta WHERE name = 'entries'").fetchone()
+        return count
+
+    def __len__(self) -> int:
+        self.flush()
+        return self._count()
+
+    def export_to(self, path: Path) -> int:
+        """Write all entries to ``path`` as JSON lines; ``.gz`` paths are gzipped.
+
+        Returns the number of entries written.
+        """
+
+        self.flush()
+        count = 0
+        with _open_text(path, "w") as f:
+            cur = self.conn.execute("SELECT dev, ino, size, mtime_ns, algorithm, digest, last_used FROM hashes")
+            for dev, ino, size, mtime_ns, algorithm, digest, last_used in cur:
+                record = {
+                    "dev": dev,
+                    "ino": ino,
+                    "size": size,
+                    "mtime_ns": mtime_ns,
+                    "algorithm": algorithm,
+                    "digest": digest.hex(),
+                    "last_used": last_used,
+                }
+                f.write(json.dumps(record) + "\n")
+                count += 1
+        return count
+
+    def import_from(self, path: Path, device_map: Optional[Dict[int, int]] = None, batch_size: int = 10000) -> int:
+        """Merge entries exported by :meth:`export_to` into this cache.
+
+        Parameters
+        ----------
+        path:
+            File written by :meth:`export_to`.
+        device_map:
+            Optional mapping from device ids on the exporting host to device
+            ids of the same volumes on this host.  Entries for unmapped
+            devices are imported unchanged.
+        batch_size:
+            Number of entries written per transaction.
+
+        Returns the number of entries read.
+        """
+
+        self.flush()
+        device_map = device_map or {}
+        count = 0
+        batch: List[tuple] = []
+        with _open_text(path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                r = json.loads(line)
+                batch.append(
+                    (
+                        device_map.get(r["dev"], r["dev"]),
+                        r["ino"],
+                        r["size"],
+                        r["mtime_ns"],
+                        r["algorithm"],
+                        bytes.fromhex(r["digest"]),
+                        r["last_used"],
+                    )
+                )
+                if len(batch) >= batch_size:
+                    count += self._write_batch(batch)
+                    batch = []
+        count += self._write_batch(batch)
+        return count
+
+    def _write_batch(self, batch: List[tuple]) -> int:
+        with self._lock, self.conn:
+            added = self.conn.executemany("INSERT OR IGNORE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?)", batch).rowcount
+            self.conn.executemany(
+                "UPDATE hashes SET digest = ?, last_used = MAX(last_used, ?) "
+                "WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ? AND algorithm = ?",
+                (row[5:] + row[:5] for row in batch),
+            )
+            self._evict(added)
+        return len(batch)
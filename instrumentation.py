@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+"""Progress reporting, phase timing and metrics for inventory scans.
+
+A :class:`ScanInstrumentation` object can be passed to
+:meth:`audio_inventory.AudioScanner.scan`,
+:meth:`audio_inventory.AudioRepository.add_files` and
+:meth:`audio_inventory.AudioInventory.run`.  It times each phase of the run,
+reports progress (files and bytes done, ETA) through an optional callback,
+flags files that take unusually long to hash and finally produces a
+:class:`ScanReport`.  Components only touch the instrumentation when one is
+supplied, so an uninstrumented scan pays nothing beyond an ``is None`` check.
+"""
+
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+import json
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+
+@dataclass
+class ScanProgress:
+    """Snapshot of a running scan passed to progress callbacks."""
+
+    files_done: int
+    files_total: int
+    bytes_done: int
+    bytes_total: int
+    elapsed: float  # seconds since the hashing phase started
+    eta: Optional[float]  # estimated seconds remaining, ``None`` if unknown
+
+
+@dataclass
+class ScanReport:
+    """Summary of a completed scan."""
+
+    root: str
+    files: int = 0
+    bytes: int = 0
+    phases: Dict[str, float] = field(default_factory=dict)  # phase -> seconds
+    slow_files: List[Tuple[str, float]] = field(default_factory=list)
+
+    @property
+    def elapsed(self) -> float:
+        """Total seconds spent across all phases."""
+
+        return sum(self.phases.values())
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self) -> Dict[str, object]:
+        data = asdict(self)
+        data["elapsed"] = self.elapsed
+        data["files_per_second"] = self.files_per_second
+        data["bytes_per_second"] = self.bytes_per_second
+        return data
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self, prefix: str = "py_inv_scan") -> str:
+        """Return the report in the Prometheus text exposition format."""
+
+        label = 'root="{}"'.format(self.root.replace("\\", "\\\\").replace('"', '\\"'))
+        lines = [
+            f"# TYPE {prefix}_files_total counter",
+            f"{prefix}_files_total{{{label}}} {self.files}",
+            f"# TYPE {prefix}_bytes_total counter",
+            f"{prefix}_bytes_total{{{label}}} {self.bytes}",
+            f"# TYPE {prefix}_slow_files_total counter",
+            f"{prefix}_slow_files_total{{{label}}} {len(self.slow_files)}",
+            f"# TYPE {prefix}_phase_seconds gauge",
+        ]
+        for phase, seconds in self.phases.items():
+            lines.append(f'{prefix}_phase_seconds{{{label},phase="{phase}"}} {seconds:.6f}')
+        lines += [
+            f"# TYPE {prefix}_files_per_second gauge",
+            f"{prefix}_files_per_second{{{label}}} {self.files_per_second:.3f}",
+            f"# TYPE {prefix}_bytes_per_second gauge",
+            f"{prefix}_bytes_per_second{{{label}}} {self.bytes_per_second:.3f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def write_metrics(report: ScanReport, path: Path) -> None:
+    """Write ``report`` to ``path``.
+
+    Files ending in ``.prom`` or ``.txt`` receive the Prometheus text format,
+    anything else receives JSON.
+    """
+
+    path = Path(path)
+    if path.suffix in (".prom", ".txt"):
+        path.write_text(report.to_prometheus())
+    else:
+        path.write_text(report.to_json() + "\n")
+
+
+class ScanInstrumentation:
+    """Collect timings and emit progress events during a scan.
+
+    Parameters
+    ----------
+    on_progress:
+        Callable receiving a :class:`ScanProgress` at most every
+        ``progress_interval`` seconds and once more when hashing finishes.
+    on_slow_file:
+        Callable receiving ``(path, seconds)`` for each slow file.
+    slow_file_seconds:
+        Files taking at least this long to process are reported as slow.
+        ``None`` disables slow-file detection.
+    progress_interval:
+        Minimum number of seconds between two progress callbacks.
+    clock:
+        Monotonic clock returning seconds.  Exposed for tests.
+    """
+
+    def __init__(
+        self,
+        on_progress: Optional[Callable[[ScanProgress], None]] = None,
+        on_slow_file: Optional[Callable[[Path, float], None]] = None,
+        slow_file_seconds: Optional[float] = 5.0,
+        progress_interval: float = 0.5,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        self.on_progress = on_progress
+        self.on_slow_file = on_slow_file
+        self.slow_file_seconds = slow_file_seconds
+        self.progress_interval = progress_interval
+        self.clock = clock
+        self.phases: Dict[str, float] = {}
+        self.slow_files: List[Tuple[str, float]] = []
+        self.files_total = 0
+        self.bytes_total = 0
+        self.files_done = 0
+        self.bytes_done = 0
+        self._started = 0.0
+        self._last_progress = 0.0
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the enclosed block and add it to phase ``name``."""
+
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.add_time(name, self.clock() - start)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        """Add ``seconds`` to phase ``name``."""
+
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def begin(self, files_total: int, bytes_total: int) -> None:
+        """Record the amount of work discovered by the walk phase."""
+
+        self.files_total += files_total
+        self.bytes_total += bytes_total
+        self._started = self._last_progress = self.clock()
+
+    def file_done(self, path: Path, nbytes: int, seconds: float) -> None:
+        """Record that ``path`` (``nbytes`` long) was processed in ``seconds``."""
+
+        self.files_done += 1
+        self.bytes_done += nbytes
+        if self.slow_file_seconds is not None and seconds >= self.slow_file_seconds:
+            self.slow_files.append((str(path), seconds))
+            if self.on_slow_file is not None:
+                self.on_slow_file(Path(path), seconds)
+        if self.on_progress is not None:
+            now = self.clock()
+            if now - self._last_progress >= self.progress_interval:
+                self._last_progress = now
+                self.on_progress(self.progress(now))
+
+    def end(self) -> None:
+        """Emit a final progress event once all files are processed."""
+
+        if self.on_progress is not None:
+            self.on_progress(self.progress(self.clock()))
+
+    def progress(self, now: Optional[float] = None) -> ScanProgress:
+        """Return the current :class:`ScanProgress`."""
+
+        elapsed = (self.clock() if now is None else now) - self._started
+        eta: Optional[float] = None
+        if self.bytes_done and elapsed > 0:
+            eta = (self.bytes_total - self.bytes_done) * elapsed / self.bytes_done
+        elif self.files_done and elapsed > 0:
+            eta = (self.files_total - self.files_done) * elapsed / self.files_done
+        return ScanProgress(
+            files_done=self.files_done,
+            files_total=self.files_total,
+            bytes_done=self.bytes_done,
+            bytes_total=self.bytes_total,
+            elapsed=elapsed,
+            eta=eta,
+        )
+
+    def report(self, root: Path) -> ScanReport:
+        """Return a :class:`ScanReport` for everything recorded so far."""
+
+        return ScanReport(
+            root=str(root),
+            files=self.files_done,
+            bytes=self.bytes_done,
+            phases=dict(self.phases),
+            slow_files=list(self.slow_files),
+        )
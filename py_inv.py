@@ -0,0 +1,497 @@
+from __future__ import annotations
+
+"""Command-line entry point for the inventory tools.
+
+Run ``python -m py_inv --help`` for the list of subcommands.  Only
+:mod:`argparse` is imported at start-up; the modules doing the actual work
+(hashing, SQLite access, network requests) are imported inside the handler of
+the subcommand that needs them, so ``--help`` and simple queries start quickly.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+DEFAULT_DB = "directory_inventory.db"
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+# Mirrors ``audio_inventory.HASH_ALGORITHMS``; duplicated to avoid importing
+# the module just to build the parser.
+HASH_ALGORITHMS = ("sha1", "md5", "sha256", "blake2b")
+
+
+def _print_progress(progress) -> None:
+    eta = "?" if progress.eta is None else f"{progress.eta:.0f}s"
+    print(
+        f"\r{progress.files_done}/{progress.files_total} files, "
+        f"{progress.bytes_done / 1e6:.1f}/{progress.bytes_total / 1e6:.1f} MB, ETA {eta}",
+        end="",
+        file=sys.stderr,
+        flush=True,
+    )
+
+
+def _scan(args: argparse.Namespace, incremental: bool, prune: bool) -> int:
+    cache = None
+    if args.hash_cache is not None:
+        from hash_cache import HashCache
+
+        cache = HashCache(args.hash_cache, max_entries=args.hash_cache_size)
+    try:
+        for root in args.roots:
+            _scan_root(args, root, cache, incremental, prune)
+    finally:
+        if cache is not None:
+            cache.close()
+    return 0
+
+
+def _scan_root(args: argparse.Namespace, root: Path, cache, incremental: bool, prune: bool) -> None:
+    from audio_inventory import AudioInventory
+    from instrumentation import ScanInstrumentation, write_metrics
+
+    # Instrumentation walks the whole tree up front to size the progress bar,
+    # so only pay for it when something will use the timings.
+    instrumentation = None
+    if args.progress or args.metrics is not None or args.slow_file_seconds is not None:
+        instrumentation = ScanInstrumentation(
+            on_progress=_print_progress if args.progress else None,
+            slow_file_seconds=args.slow_file_seconds,
+        )
+    options = dict(algorithm=args.hash_algorithm, workers=args.workers, chunk_size=args.chunk_size, cache=cache)
+    if args.shard_dir is not None:
+        from shards import ShardedInventory
+
+        inventory = ShardedInventory(args.shard_dir, by=args.shard_by).inventory(root, **options)
+    else:
+        inventory = AudioInventory(root, args.db, **options)
+    report = inventory.run(
+        overwrite=args.overwrite,
+        instrumentation=instrumentation,
+        batch_size=args.batch_size,
+        incremental=incremental,
+        prune=prune,
+    )
+    if args.progress:
+        print(file=sys.stderr)
+    print(
+        f"{report.root}: {report.files} files, {report.bytes / 1e6:.1f} MB "
+        f"in {report.elapsed:.1f}s ({report.files_per_second:.1f} files/s)"
+    )
+    for path, seconds in report.slow_files:
+        print(f"  slow: {path} ({seconds:.1f}s)")
+    if args.metrics is not None:
+        write_metrics(report, args.metrics)
+
+
+def cmd_scan(args: argparse.Namespace) -> int:
+    return _scan(args, incremental=args.incremental, prune=False)
+
+
+def cmd_rescan(args: argparse.Namespace) -> int:
+    return _scan(args, incremental=True, prune=True)
+
+
+def _reader(args: argparse.Namespace):
+    """Return the repository or federated shard reader selected by ``args``."""
+
+    if args.shard_dir is not None:
+        from shards import ShardedInventory
+
+        return ShardedInventory(args.shard_dir).reader()
+    from audio_inventory import AudioRepository
+
+    return AudioRepository(args.db)
+
+
+def cmd_dupes(args: argparse.Namespace) -> int:
+    import json
+
+    with _reader(args) as repo:
+        for digest, paths in repo.duplicates(min_copies=args.min_copies):
+            if args.json:
+                print(json.dumps({"filehash": digest, "paths": paths}))
+            else:
+                print(digest)
+                for path in paths:
+                    print(f"  {path}")
+    return 0
+
+
+def cmd_query(args: argparse.Namespace) -> int:
+    import json
+
+    with _reader(args) as repo:
+        if args.hash is not None:
+            rows = repo.find_by_hash(args.hash)
+        else:
+            rows = repo.search_paths(args.path, limit=args.limit)
+    for row in rows:
+        if args.json:
+            print(json.dumps(dict(row)))
+        else:
+            print(f"{row['filehash']}\t{row['path']}")
+    return 0 if rows else 1
+
+
+def cmd_shard_compact(args: argparse.Namespace) -> int:
+    from shards import ShardedInventory, compact_shard
+
+    for shard in ShardedInventory(args.shard_dir).shards():
+        compact_shard(shard)
+        print(f"compacted {shard}")
+    return 0
+
+
+def cmd_shard_merge(args: argparse.Namespace) -> int:
+    from shards import merge_shards
+
+    count = merge_shards(args.sources, args.dest, overwrite=not args.keep_first)
+    print(f"{args.dest}: {count} rows")
+    return 0
+
+
+def cmd_verify(args: argparse.Namespace) -> int:
+    from verify import VerificationScheduler
+
+    if args.shard_dir is not None:
+        from shards import ShardedInventory
+
+        databases = ShardedInventory(args.shard_dir).shards()
+    else:
+        databases = [args.db]
+    failures = 0
+    for db_path in databases:
+        scheduler = VerificationScheduler(
+            db_path,
+            period_days=args.period_days,
+            runs_per_day=args.runs_per_day,
+            bytes_per_second=args.max_mbps * 1e6 if args.max_mbps else None,
+            ios_per_second=args.max_iops,
+        )
+        scheduler.init_schema()
+        result = scheduler.run(limit=args.limit, max_seconds=args.max_seconds)
+        print(
+            f"{db_path}: verified {result.checked} files ({result.bytes / 1e6:.1f} MB) in {result.seconds:.1f}s, "
+            f"{len(result.mismatches)} mismatched, {len(result.missing)} missing, "
+            f"{len(result.changed)} changed, {len(result.unreadable)} unreadable"
+        )
+        for path, expected, actual in result.mismatches:
+            print(f"  MISMATCH {path}: expected {expected}, got {actual}")
+        for path in result.missing:
+            print(f"  MISSING {path}")
+        for path in result.changed:
+            print(f"  CHANGED {path} (modified since scanned; rescan)")
+        for path, reason in result.unreadable:
+            print(f"  UNREADABLE {path}: {reason}")
+        failures += len(result.mismatches) + len(result.unreadable)
+    return 1 if failures else 0
+
+
+def _filter_value(text: str):
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    from exporter import export_table
+
+    filters = []
+    for column, op, value in args.where:
+        if op.lower() == "in":
+            filters.append((column, op, [_filter_value(v) for v in value.split(",")]))
+        else:
+            filters.append((column, op, _filter_value(value)))
+    count = export_table(
+        args.db,
+        args.table,
+        args.dest,
+        columns=args.columns.split(",") if args.columns else None,
+        filters=filters,
+        batch_size=args.batch_size,
+    )
+    print(f"{count} rows from {args.table} written to {args.dest}")
+    return 0
+
+
+def cmd_import(args: argparse.Namespace) -> int:
+    from exporter import import_table
+
+    count = import_table(args.db, args.table, args.src, replace=args.replace, batch_size=args.batch_size)
+    print(f"{count} rows from {args.src} loaded into {args.table}")
+    return 0
+
+
+def cmd_serve(args: argparse.Namespace) -> int:
+    from query_service import QueryServer, QueryService
+
+    service = QueryService(
+        args.db,
+        gd_db=args.gd_db,
+        pool_size=args.pool_size,
+        cache_size=args.cache_size,
+        wal=not args.no_wal,
+        pool_timeout=args.pool_timeout,
+    )
+    server = QueryServer(service, args.host, args.port, verbose=args.verbose)
+    print(f"serving {args.db} on http://{server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+def cmd_coverage(args: argparse.Namespace) -> int:
+    from backup_coverage import CoverageEngine
+
+    engine = CoverageEngine(args.db, args.roots).load()
+    report = engine.report(min_replicas=args.min_replicas)
+    for cov in report.roots.values():
+        print(
+            f"{cov.root}: {cov.contents} recordings, {cov.bytes / 1e9:.2f} GB; "
+            f"only here: {cov.unique_contents} ({cov.unique_bytes / 1e9:.2f} GB)"
+        )
+        if cov.unsized_files:
+            print(
+                f"  {cov.unsized_files} files have no stored size (rescan to record it); "
+                f"{cov.unsized_contents} recordings, {cov.unique_unsized} of them only here, "
+                f"are not counted in the GB figures"
+            )
+    for copies, count in report.replicas.items():
+        print(f"  {count} recordings on {copies} root(s)")
+    if args.list:
+        for item in report.under_replicated:
+            size = "?" if item.size is None else item.size
+            print(f"{item.digest_prefix}\t{size}\t{', '.join(item.roots)}")
+            for _, path in engine.paths_for(item.digest_prefix):
+                print(f"  {path}")
+    return 0
+
+
+def cmd_dir_index(args: argparse.Namespace) -> int:
+    from directory_index import DirectoryIndex
+
+    index = DirectoryIndex(args.db)
+    index.init_schema()
+    for root in args.roots:
+        count = index.build(root, batch_size=args.batch_size)
+        print(f"{root}: {count} directories")
+    return 0
+
+
+def cmd_dir_top(args: argparse.Namespace) -> int:
+    from directory_index import DirectoryIndex
+
+    nodes = DirectoryIndex(args.db).largest_subtrees(args.root, limit=args.limit, depth=args.depth)
+    for node in nodes:
+        print(f"{node.total_bytes / 1e9:10.2f} GB {node.total_files:9d} files  {node.path}")
+    return 0
+
+
+def cmd_hash_cache(args: argparse.Namespace) -> int:
+    from hash_cache import HashCache
+
+    if args.action != "stats" and args.file is None:
+        print(f"py_inv hash-cache {args.action}: a FILE argument is required", file=sys.stderr)
+        return 2
+    with HashCache(args.cache) as cache:
+        if args.action == "export":
+            count = cache.export_to(args.file)
+            print(f"{count} entries exported to {args.file}")
+        elif args.action == "import":
+            device_map = dict(tuple(int(x) for x in pair.split(":", 1)) for pair in args.map_device)
+            count = cache.import_from(args.file, device_map=device_map)
+            print(f"{count} entries imported from {args.file}")
+        else:
+            print(f"{len(cache)} entries in {args.cache}")
+    return 0
+
+
+def cmd_gd_build(args: argparse.Namespace) -> int:
+    from grateful_dead import build_database_and_files
+
+    build_database_and_files(args.db, args.base, args.shows, args.recordings)
+    return 0
+
+
+def cmd_archive_sync(args: argparse.Namespace) -> int:
+    from archive_scanner import fetch_archive_shows
+    from grateful_dead import GratefulDeadDB
+
+    shows = fetch_archive_shows(args.start_year, args.end_year)
+    db = GratefulDeadDB(args.db)
+    db.init_schema()
+    db.add_archive_shows(shows)
+    print(f"{len(shows)} archive items stored in {args.db}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="py_inv", description="Inventory of audio files.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    db = argparse.ArgumentParser(add_help=False)
+    db.add_argument("--db", type=Path, default=Path(DEFAULT_DB), help=f"inventory database (default: {DEFAULT_DB})")
+
+    shard_dir = argparse.ArgumentParser(add_help=False)
+    shard_dir.add_argument("--shard-dir", type=Path, help="use one database per root in this directory instead of --db")
+
+    scan_opts = argparse.ArgumentParser(add_help=False)
+    scan_opts.add_argument("roots", nargs="+", type=Path, help="directories to scan")
+    scan_opts.add_argument("--workers", type=int, default=1, help="threads hashing files concurrently")
+    scan_opts.add_argument("--batch-size", type=int, default=1000, help="files committed per transaction")
+    scan_opts.add_argument("--hash-algorithm", choices=HASH_ALGORITHMS, default="sha1")
+    scan_opts.add_argument("--chunk-size", type=int, default=1024 * 1024, help="read size in bytes when hashing")
+    scan_opts.add_argument("--overwrite", action="store_true", help="replace rows for paths already stored")
+    scan_opts.add_argument("--progress", action="store_true", help="show progress on stderr")
+    scan_opts.add_argument("--slow-file-seconds", type=float, help="report files slower than this")
+    scan_opts.add_argument("--metrics", type=Path, help="write a JSON (or .prom) scan report to this file")
+    scan_opts.add_argument("--hash-cache", type=Path, help="shared hash cache consulted before reading files")
+    scan_opts.add_argument("--hash-cache-size", type=int, default=5_000_000, help="maximum hash cache entries")
+    scan_opts.add_argument("--shard-by", choices=("root", "device"), default="root", help="shard key for --shard-dir")
+
+    p = sub.add_parser("scan", parents=[db, shard_dir, scan_opts], help="scan directories into the inventory")
+    p.add_argument(
+        "--incremental",
+        "--resume",
+        dest="incremental",
+        action="store_true",
+        help="reuse hashes of unchanged files; continues an interrupted scan",
+    )
+    p.set_defaults(func=cmd_scan)
+
+    p = sub.add_parser(
+        "rescan", parents=[db, shard_dir, scan_opts], help="incrementally update directories and drop deleted files"
+    )
+    p.set_defaults(func=cmd_rescan)
+
+    p = sub.add_parser("dupes", parents=[db, shard_dir], help="list files stored more than once")
+    p.add_argument("--min-copies", type=int, default=2)
+    p.add_argument("--json", action="store_true", help="print one JSON object per line")
+    p.set_defaults(func=cmd_dupes)
+
+    p = sub.add_parser("query", parents=[db, shard_dir], help="look up files by hash or path")
+    what = p.add_mutually_exclusive_group(required=True)
+    what.add_argument("--hash", help="exact content hash")
+    what.add_argument("--path", help="substring of the file path")
+    p.add_argument("--limit", type=int, help="maximum number of path matches")
+    p.add_argument("--json", action="store_true", help="print one JSON object per line")
+    p.set_defaults(func=cmd_query)
+
+    p = sub.add_parser("shard-compact", help="checkpoint and vacuum every shard offline")
+    p.add_argument("shard_dir", type=Path)
+    p.set_defaults(func=cmd_shard_compact)
+
+    p = sub.add_parser("shard-merge", help="merge shard databases into one database offline")
+    p.add_argument("dest", type=Path, help="database to merge into (created if missing)")
+    p.add_argument("sources", nargs="+", type=Path, help="shard databases to merge")
+    p.add_argument("--keep-first", action="store_true", help="keep existing rows instead of replacing them")
+    p.set_defaults(func=cmd_shard_merge)
+
+    p = sub.add_parser("verify", parents=[db, shard_dir], help="re-hash the next slice of files to detect bit rot")
+    p.add_argument("--period-days", type=float, default=90, help="verify every file once within this period")
+    p.add_argument("--runs-per-day", type=float, default=1, help="how often this command is scheduled")
+    p.add_argument("--max-mbps", type=float, help="read bandwidth limit in MB/s")
+    p.add_argument("--max-iops", type=float, help="read operations per second limit")
+    p.add_argument("--limit", type=int, help="files to verify instead of the computed slice")
+    p.add_argument("--max-seconds", type=float, help="stop after this much time")
+    p.set_defaults(func=cmd_verify)
+
+    p = sub.add_parser("export", parents=[db], help="stream a table to .parquet, .jsonl, .jsonl.gz or .jsonl.zst")
+    p.add_argument("table", help="e.g. audiofiles, shows or recordings")
+    p.add_argument("dest", type=Path, help="output file; the suffix selects the format")
+    p.add_argument("--columns", help="comma-separated columns to export")
+    p.add_argument(
+        "--where",
+        nargs=3,
+        action="append",
+        default=[],
+        metavar=("COLUMN", "OP", "VALUE"),
+        help="filter applied in SQL, e.g. --where size '>=' 1000000; "
+        "'in' takes comma-separated values, e.g. --where extension in .mp3,.flac",
+    )
+    p.add_argument("--batch-size", type=int, default=50_000)
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("import", parents=[db], help="load a table from a file written by export")
+    p.add_argument("table")
+    p.add_argument("src", type=Path)
+    p.add_argument("--replace", action="store_true", help="replace rows whose key already exists")
+    p.add_argument("--batch-size", type=int, default=50_000)
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("serve", parents=[db], help="serve read-only JSON lookups over HTTP")
+    p.add_argument("--gd-db", type=Path, help="Grateful Dead database for /shows")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8080)
+    p.add_argument("--pool-size", type=int, default=8, help="read-only connections per database")
+    p.add_argument("--cache-size", type=int, default=1024, help="cached responses per database")
+    p.add_argument(
+        "--pool-timeout", type=float, default=5.0, help="seconds to wait for a free connection before answering 503"
+    )
+    p.add_argument("--no-wal", action="store_true", help="do not switch the databases to WAL mode")
+    p.add_argument("--verbose", action="store_true", help="log every request")
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser("coverage", parents=[db], help="report content held by too few backup roots")
+    p.add_argument("roots", nargs="+", type=Path, help="scan roots that should mirror each other")
+    p.add_argument("--min-replicas", type=int, default=2, help="required number of roots holding each file")
+    p.add_argument("--list", action="store_true", help="list under-replicated files and their paths")
+    p.set_defaults(func=cmd_coverage)
+
+    p = sub.add_parser("dir-index", parents=[db], help="index directory trees with recursive size totals")
+    p.add_argument("roots", nargs="+", type=Path, help="directories to index")
+    p.add_argument("--batch-size", type=int, default=5000, help="directories inserted per executemany call")
+    p.set_defaults(func=cmd_dir_index)
+
+    p = sub.add_parser("dir-top", parents=[db], help="list the largest subtrees of an indexed directory")
+    p.add_argument("root", type=Path, help="a root previously passed to dir-index")
+    p.add_argument("--limit", type=int, default=20)
+    p.add_argument("--depth", type=int, help="only directories at this depth below the root")
+    p.set_defaults(func=cmd_dir_top)
+
+    p = sub.add_parser("hash-cache", help="export, import or inspect a shared hash cache")
+    p.add_argument("action", choices=("export", "import", "stats"))
+    p.add_argument("cache", type=Path, help="hash cache file")
+    p.add_argument("file", type=Path, nargs="?", help="JSON lines file (.gz to compress) for export/import")
+    p.add_argument(
+        "--map-device",
+        action="append",
+        default=[],
+        metavar="SRC:DST",
+        help="on import, translate device id SRC of the exporting host to DST",
+    )
+    p.set_defaults(func=cmd_hash_cache)
+
+    p = sub.add_parser("gd-build", help="build the Grateful Dead database and directory tree")
+    p.add_argument("--db", type=Path, default=Path("grateful_dead.db"))
+    p.add_argument("--base", type=Path, required=True, help="where to mirror the show directories")
+    p.add_argument("--shows", type=Path, default=DATA_DIR / "gd_shows.csv")
+    p.add_argument("--recordings", type=Path, default=DATA_DIR / "gd_recordings.csv")
+    p.set_defaults(func=cmd_gd_build)
+
+    p = sub.add_parser("archive-sync", help="store Internet Archive GratefulDead items in the database")
+    p.add_argument("--db", type=Path, default=Path("grateful_dead.db"))
+    p.add_argument("--start-year", type=int, default=1965)
+    p.add_argument("--end-year", type=int, default=1995)
+    p.set_defaults(func=cmd_archive_sync)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
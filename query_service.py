@@ -0,0 +1,383 @@
+from __future__ import annotations
+
+"""Read-only HTTP/JSON query service over the inventory databases.
+
+The service is built on :class:`http.server.ThreadingHTTPServer` so it has no
+dependencies beyond the standard library.  Requests borrow a connection from
+a :class:`ConnectionPool` of read-only SQLite connections; with the database
+in WAL mode they never block, or get blocked by, a scan writing to the same
+file.  Small lookups are answered from a :class:`QueryCache`, which is
+cleared whenever another connection commits to the database (detected with
+``PRAGMA data_version``).  Large result sets such as the duplicate listing are
+streamed as a chunked JSON array instead of being built in memory.
+
+Endpoints (all ``GET``):
+
+``/hash/<filehash>``
+    Files with the given content hash.
+``/path?q=<text>&limit=<n>``
+    Files whose path contains ``text``; at most :data:`DEFAULT_PATH_LIMIT`
+    unless ``limit`` (up to :data:`MAX_PATH_LIMIT`) is given.
+``/shows?date=<YYYY-MM-DD>`` or ``/shows?year=<YYYY>``
+    Grateful Dead shows with their recordings (needs ``gd_db``).
+``/dupes?min=<n>``
+    Content stored at least ``n`` times, streamed.
+``/health``
+    Liveness check.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import json
+import queue
+import sqlite3
+import threading
+from typing import Callable, Dict, Hashable, Iterator, List, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from audio_inventory import AudioRepository
+
+DEFAULT_PATH_LIMIT = 1000
+MAX_PATH_LIMIT = 10_000
+
+# Responses larger than this are served but not cached.
+MAX_CACHED_BYTES = 256 * 1024
+
+
+def enable_wal(db_path: Path) -> None:
+    """Switch ``db_path`` to write-ahead logging so readers and writers coexist."""
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+    finally:
+        conn.close()
+
+
+def _connect_ro(db_path: Path) -> sqlite3.Connection:
+    uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class PoolExhausted(RuntimeError):
+    """No pooled connection became free within the pool's timeout."""
+
+
+class ConnectionPool:
+    """Fixed-size pool of read-only connections to one database.
+
+    Parameters
+    ----------
+    db_path:
+        Database to connect to.
+    size:
+        Number of connections.
+    timeout:
+        Seconds to wait for a free connection before raising
+        :class:`PoolExhausted`.
+    """
+
+    def __init__(self, db_path: Path, size: int = 8, timeout: float = 5.0) -> None:
+        self.db_path = Path(db_path)
+        self.timeout = timeout
+        self._idle: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._all = [_connect_ro(self.db_path) for _ in range(size)]
+        for conn in self._all:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection, waiting up to ``timeout`` if all of them are in use."""
+
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolExhausted(f"no free connection to {self.db_path} within {self.timeout}s") from None
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        for conn in self._all:
+            conn.close()
+
+
+class QueryCache:
+    """Thread-safe LRU cache of encoded responses for one database.
+
+    Parameters
+    ----------
+    db_path:
+        Database whose commits invalidate the cache.
+    max_entries:
+        Number of responses kept.
+    max_entry_bytes:
+        Larger responses are returned without being cached, so the cache
+        holds at most ``max_entries * max_entry_bytes`` bytes.
+    """
+
+    def __init__(self, db_path: Path, max_entries: int = 1024, max_entry_bytes: int = MAX_CACHED_BYTES) -> None:
+        self.max_entries = max_entries
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        # data_version changes whenever another connection commits, so this
+        # otherwise idle connection tells us when cached answers went stale.
+        self._watcher = _connect_ro(Path(db_path))
+        self._version = self._data_version()
+        self.hits = 0
+        self.misses = 0
+
+    def _data_version(self) -> int:
+        return self._watcher.execute("PRAGMA data_version").fetchone()[0]
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], bytes]) -> bytes:
+        """Return the cached response for ``key``, computing it on a miss."""
+
+        with self._lock:
+            version = self._data_version()
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        value = compute()
+        if len(value) > self.max_entry_bytes:
+            return value
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = value
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self) -> None:
+        """Drop every cached response."""
+
+        with self._lock:
+            self._entries.clear()
+
+    def close(self) -> None:
+        self._watcher.close()
+
+
+def _encode(data: object) -> bytes:
+    return json.dumps(data).encode("utf-8")
+
+
+class QueryService:
+    """Query logic behind the HTTP handler.
+
+    Parameters
+    ----------
+    inventory_db:
+        Database containing the ``audiofiles`` table.
+    gd_db:
+        Optional Grateful Dead database for ``/shows``.
+    pool_size:
+        Read-only connections per database.
+    cache_size:
+        Responses cached per database.
+    wal:
+        Switch the databases to WAL mode on start-up.
+    pool_timeout:
+        Seconds a request waits for a free connection before getting a 503.
+    """
+
+    def __init__(
+        self,
+        inventory_db: Path,
+        gd_db: Optional[Path] = None,
+        pool_size: int = 8,
+        cache_size: int = 1024,
+        wal: bool = True,
+        pool_timeout: float = 5.0,
+    ) -> None:
+        databases = [Path(inventory_db)] + ([Path(gd_db)] if gd_db is not None else [])
+        if wal:
+            for db in databases:
+                enable_wal(db)
+        self.inventory_db = Path(inventory_db)
+        self.pool = ConnectionPool(self.inventory_db, pool_size, pool_timeout)
+        self.cache = QueryCache(self.inventory_db, cache_size)
+        self.gd_pool: Optional[ConnectionPool] = None
+        self.gd_cache: Optional[QueryCache] = None
+        if gd_db is not None:
+            self.gd_pool = ConnectionPool(Path(gd_db), pool_size, pool_timeout)
+            self.gd_cache = QueryCache(Path(gd_db), cache_size)
+
+    def close(self) -> None:
+        self.pool.close()
+        self.cache.close()
+        if self.gd_pool is not None and self.gd_cache is not None:
+            self.gd_pool.close()
+            self.gd_cache.close()
+
+    def _repository(self, conn: sqlite3.Connection) -> AudioRepository:
+        repo = AudioRepository(self.inventory_db)
+        repo.conn = conn
+        return repo
+
+    def by_hash(self, filehash: str) -> bytes:
+        def compute() -> bytes:
+            with self.pool.connection() as conn:
+                return _encode([dict(r) for r in self._repository(conn).find_by_hash(filehash)])
+
+        return self.cache.get_or_compute(("hash", filehash), compute)
+
+    def by_path(self, text: str, limit: int = DEFAULT_PATH_LIMIT) -> bytes:
+        if not 0 < limit <= MAX_PATH_LIMIT:
+            raise ValueError(f"limit must be between 1 and {MAX_PATH_LIMIT}")
+
+        def compute() -> bytes:
+            with self.pool.connection() as conn:
+                return _encode([dict(r) for r in self._repository(conn).search_paths(text, limit=limit)])
+
+        return self.cache.get_or_compute(("path", text, limit), compute)
+
+    def shows(self, date: Optional[str], year: Optional[str]) -> bytes:
+        if self.gd_pool is None or self.gd_cache is None:
+            raise LookupError("no Grateful Dead database configured")
+        pool = self.gd_pool
+        pattern = date if date is not None else f"{year}-%"
+
+        def compute() -> bytes:
+            with pool.connection() as conn:
+                rows = conn.execute(
+                    """
+                    SELECT s.date, s.venue, r.source FROM shows s
+                    LEFT JOIN recordings r ON r.show_id = s.id
+                    WHERE s.date LIKE ? ORDER BY s.date, r.id
+                    """,
+                    (pattern,),
+                ).fetchall()
+            shows: Dict[str, Dict[str, object]] = {}
+            for row in rows:
+                show = shows.setdefault(row["date"], {"date": row["date"], "venue": row["venue"], "recordings": []})
+                if row["source"] is not None:
+                    show["recordings"].append(row["source"])
+            return _encode(list(shows.values()))
+
+        return self.gd_cache.get_or_compute(("shows", pattern), compute)
+
+    def iter_dupes(self, min_copies: int) -> Iterator[bytes]:
+        """Return an iterator over the encoded elements of the duplicate listing.
+
+        The pooled connection is taken before returning, so
+        :class:`PoolExhausted` is raised here rather than after a response
+        has started.  The connection is returned when the iterator is
+        exhausted or closed.
+        """
+
+        items = self._dupes(min_copies)
+        next(items)
+        return items
+
+    def _dupes(self, min_copies: int) -> Iterator[bytes]:
+        with self.pool.connection() as conn:
+            yield b""  # connection acquired; see iter_dupes
+            for digest, paths in self._repository(conn).duplicates(min_copies=min_copies):
+                yield _encode({"filehash": digest, "paths": paths})
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """Map HTTP requests to :class:`QueryService` calls."""
+
+    protocol_version = "HTTP/1.1"
+    server: "QueryServer"
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str) -> None:
+        self._send(status, _encode({"error": message}))
+
+    def _stream(self, items: Iterator[bytes]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def chunk(data: bytes) -> None:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+        buffer: List[bytes] = []
+        size = 0
+        separator = b"["
+        try:
+            for item in items:
+                buffer.append(separator + item)
+                separator = b","
+                size += len(item) + 1
+                if size >= 64 * 1024:
+                    chunk(b"".join(buffer))
+                    buffer, size = [], 0
+            buffer.append(b"[]" if separator == b"[" else b"]")
+            chunk(b"".join(buffer))
+            self.wfile.write(b"0\r\n\r\n")
+        except (sqlite3.Error, OSError) as exc:
+            # The status line is already out, so a new response cannot be
+            # sent; drop the connection without the terminating chunk and
+            # the client sees a truncated body.
+            self.log_error("stream aborted: %s", exc)
+            self.close_connection = True
+        finally:
+            close = getattr(items, "close", None)
+            if close is not None:
+                close()
+
+    def do_GET(self) -> None:
+        service = self.server.service
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            if url.path == "/health":
+                self._send(200, b'{"status": "ok"}')
+            elif url.path.startswith("/hash/"):
+                self._send(200, service.by_hash(unquote(url.path[len("/hash/"):]).lower()))
+            elif url.path == "/path" and "q" in params:
+                limit = int(params.get("limit", DEFAULT_PATH_LIMIT))
+                self._send(200, service.by_path(params["q"], limit))
+            elif url.path == "/shows" and ("date" in params or "year" in params):
+                self._send(200, service.shows(params.get("date"), params.get("year")))
+            elif url.path == "/dupes":
+                self._stream(service.iter_dupes(int(params.get("min", 2))))
+            else:
+                self._send_error(404, "unknown endpoint")
+        except ValueError as exc:
+            self._send_error(400, str(exc))
+        except LookupError as exc:
+            self._send_error(404, str(exc))
+        except PoolExhausted as exc:
+            self._send_error(503, str(exc))
+        except sqlite3.Error as exc:
+            self._send_error(500, str(exc))
+
+
+class QueryServer(ThreadingHTTPServer):
+    """Threaded HTTP server bound to a :class:`QueryService`."""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, service: QueryService, host: str = "127.0.0.1", port: int = 8080, verbose: bool = False) -> None:
+        self.service = service
+        self.verbose = verbose
+        super().__init__((host, port), QueryHandler)
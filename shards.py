@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+"""One inventory database per scan root or device, queried as one.
+
+A single ``directory_inventory.db`` shared by every drive serialises all
+writers and is a single point of failure.  :class:`ShardedInventory` instead
+gives each root (or each device) its own SQLite file in WAL mode inside a
+shard directory, so scanners of different drives never contend for a lock.
+:class:`FederatedReader` attaches the shards read-only to one connection and
+exposes a ``all_audiofiles`` view over them, answering the same lookups as
+:class:`audio_inventory.AudioRepository`.  :func:`compact_shard` and
+:func:`merge_shards` maintain shards offline.
+"""
+
+from heapq import merge
+from itertools import groupby
+from operator import itemgetter
+from pathlib import Path
+import os
+import re
+import sqlite3
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from audio_inventory import AudioInventory, AudioRepository
+
+SHARD_SUFFIX = ".db"
+SHARD_BY = ("root", "device")
+
+# SQLite's default SQLITE_MAX_ATTACHED.  Readers attach shards in groups of
+# at most this many and combine the groups in Python.
+MAX_ATTACHED = 10
+
+
+def shard_name(root: Path, by: str = "root") -> str:
+    """Return the shard file name used for ``root``.
+
+    ``by="root"`` gives every root its own shard, named after the resolved
+    root plus a short hash so that different roots never collide.  ``by="device"`` shares
+    one shard between all roots on the same device.
+    """
+
+    if by == "device":
+        return f"dev-{os.stat(root).st_dev}{SHARD_SUFFIX}"
+    if by != "root":
+        raise ValueError(f"Unknown shard key: {by}")
+
+    import hashlib
+
+    text = str(Path(root).resolve())
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_")[:48] or "root"
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:8]
+    return f"{slug}-{digest}{SHARD_SUFFIX}"
+
+
+class ShardedInventory:
+    """Directory of per-root (or per-device) inventory databases.
+
+    Parameters
+    ----------
+    shard_dir:
+        Directory holding the shard files.  Created if necessary.
+    by:
+        ``"root"`` or ``"device"``; see :func:`shard_name`.
+    """
+
+    def __init__(self, shard_dir: Path, by: str = "root") -> None:
+        if by not in SHARD_BY:
+            raise ValueError(f"Unknown shard key: {by}")
+        self.shard_dir = Path(shard_dir)
+        self.by = by
+
+    def shard_for(self, root: Path) -> Path:
+        """Return the shard file holding rows for ``root``."""
+
+        return self.shard_dir / shard_name(root, self.by)
+
+    def shards(self) -> List[Path]:
+        """Return all shard files, sorted by name."""
+
+        if not self.shard_dir.is_dir():
+            return []
+        return sorted(self.shard_dir.glob(f"*{SHARD_SUFFIX}"))
+
+    def repository(self, root: Path) -> AudioRepository:
+        """Return an :class:`AudioRepository` writing to ``root``'s shard."""
+
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        return AudioRepository(self.shard_for(root), wal=True)
+
+    def inventory(self, root: Path, **options) -> AudioInventory:
+        """Return an :class:`AudioInventory` scanning ``root`` into its shard.
+
+        ``options`` are passed to :class:`AudioInventory`.
+        """
+
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        return AudioInventory(root, self.shard_for(root), wal=True, **options)
+
+    def reader(self) -> "FederatedReader":
+        """Return a :class:`FederatedReader` over all shards."""
+
+        return FederatedReader(self.shards())
+
+
+class FederatedReader:
+    """Read-only view over several shard databases.
+
+    Each connection attaches up to :data:`MAX_ATTACHED` shards in read-only
+    mode and defines a temporary ``all_audiofiles`` view (the ``audiofiles``
+    columns plus ``shard``) as their ``UNION ALL``.  Results from several
+    connections are combined in Python.
+    """
+
+    def __init__(self, shard_paths: Iterable[Path], max_attached: int = MAX_ATTACHED) -> None:
+        self.shard_paths = [Path(p) for p in shard_paths]
+        self.max_attached = max_attached
+        self._conns: List[sqlite3.Connection] = []
+
+    def __enter__(self) -> "FederatedReader":
+        for start in range(0, len(self.shard_paths), self.max_attached):
+            self._conns.append(self._attach(self.shard_paths[start:start + self.max_attached]))
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        for conn in self._conns:
+            conn.close()
+        self._conns = []
+
+    @staticmethod
+    def _attach(paths: List[Path]) -> sqlite3.Connection:
+        conn = sqlite3.connect("file::memory:", uri=True)
+        conn.row_factory = sqlite3.Row
+        selects = []
+        for i, path in enumerate(paths):
+            alias = f"shard{i}"
+            conn.execute(f"ATTACH DATABASE ? AS {alias}", (path.resolve().as_uri() + "?mode=ro",))
+            shard = path.stem.replace("'", "''")
+            selects.append(
+                f"SELECT name, parent, path, extension, filehash, size, mtime_ns, "
+                f"'{shard}' AS shard FROM {alias}.audiofiles"
+            )
+        if selects:
+            conn.execute("CREATE TEMP VIEW all_audiofiles AS " + " UNION ALL ".join(selects))
+        return conn
+
+    def _query(self, sql: str, params: tuple = ()) -> Iterator[sqlite3.Row]:
+        assert self._conns or not self.shard_paths, "FederatedReader is not open"
+        for conn in self._conns:
+            yield from conn.execute(sql, params)
+
+    def find_by_hash(self, filehash: str) -> List[sqlite3.Row]:
+        """Return all rows, from every shard, whose hash equals ``filehash``."""
+
+        rows = self._query("SELECT * FROM all_audiofiles WHERE filehash = ?", (filehash,))
+        return sorted(rows, key=itemgetter("path"))
+
+    def search_paths(self, text: str, limit: Optional[int] = None) -> List[sqlite3.Row]:
+        """Return rows whose path contains ``text`` across all shards."""
+
+        pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        rows = self._query(
+            "SELECT * FROM all_audiofiles WHERE path LIKE ? ESCAPE '\\' ORDER BY path LIMIT ?",
+            (pattern, -1 if limit is None else limit),
+        )
+        rows = sorted(rows, key=itemgetter("path"))
+        return rows if limit is None else rows[:limit]
+
+    def duplicates(self, min_copies: int = 2) -> Iterator[Tuple[str, List[str]]]:
+        """Yield ``(filehash, paths)`` for content stored ``min_copies`` times across shards.
+
+        Each connection streams its rows ordered by hash and the streams are
+        sort-merged, so memory use does not grow with the number of rows.
+        """
+
+        streams = [
+            conn.execute("SELECT filehash, path FROM all_audiofiles ORDER BY filehash, path")
+            for conn in self._conns
+        ]
+        rows = merge(*(((r[0], r[1]) for r in stream) for stream in streams))
+        for digest, items in groupby(rows, key=itemgetter(0)):
+            paths = [path for _, path in items]
+            if len(paths) >= min_copies:
+                yield digest, paths
+
+
+def compact_shard(path: Path) -> None:
+    """Checkpoint the WAL, refresh statistics and ``VACUUM`` a shard offline."""
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA optimize")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def merge_shards(sources: Iterable[Path], dest: Path, overwrite: bool = True) -> int:
+    """Copy the ``audiofiles`` rows of ``sources`` into ``dest``.
+
+    Only columns present in both databases are copied, so shards written by
+    older versions merge cleanly.  With ``overwrite`` rows from later sources
+    replace rows for the same path; otherwise the first row wins.
+
+    Returns the number of rows in ``dest`` afterwards.
+    """
+
+    with AudioRepository(dest) as repo:
+        repo.create_schema()
+        conn = repo.conn
+        assert conn is not None
+        dest_columns = [row[1] for row in conn.execute("PRAGMA main.table_info(audiofiles)")]
+        verb = "INSERT OR REPLACE" if overwrite else "INSERT OR IGNORE"
+        for source in sources:
+            conn.execute("ATTACH DATABASE ? AS src", (str(source),))
+            try:
+                src_columns = {row[1] for row in conn.execute("PRAGMA src.table_info(audiofiles)")}
+                columns = ", ".join(c for c in dest_columns if c in src_columns)
+                with conn:
+                    conn.execute(f"{verb} INTO main.audiofiles ({columns}) SELECT {columns} FROM src.audiofiles")
+            finally:
+                conn.execute("DETACH DATABASE src")
+        (count,) = conn.execute("SELECT COUNT(*) FROM audiofiles").fetchone()
+    return count
@@ -53,3 +53,40 @@ def test_audio_inventory_integration(tmp_path: Path) -> None:
     with sqlite3.connect(db_path) as conn:
         count = conn.execute("SELECT COUNT(*) FROM audiofiles").fetchone()[0]
     assert count == 1
+
+
+def test_create_schema_upgrades_legacy_table(tmp_path: Path) -> None:
+    """create_schema should add new columns to databases from the old scripts."""
+    db_path = tmp_path / "legacy.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "CREATE TABLE audiofiles (name TEXT, parent TEXT, path TEXT PRIMARY KEY, extension TEXT, filehash TEXT)"
+        )
+    (tmp_path / "song.mp3").write_bytes(b"abc")
+
+    with AudioRepository(db_path) as repo:
+        repo.create_schema()
+        repo.add_files(AudioScanner(tmp_path).scan())
+        row = repo.conn.execute("SELECT size, mtime_ns FROM audiofiles").fetchone()
+
+    assert row["size"] == 3
+    assert row["mtime_ns"] > 0
+
+
+def test_incremental_scan_reuses_stored_hashes(tmp_path: Path) -> None:
+    """Unchanged files should keep their stored hash instead of being re-read."""
+    (tmp_path / "song.mp3").write_bytes(b"abc")
+    db_path = tmp_path / "audio.db"
+    AudioInventory(tmp_path, db_path).run()
+
+    with AudioRepository(db_path) as repo:
+        known = repo.known_files(tmp_path)
+        key = str(tmp_path / "song.mp3")
+        size, mtime_ns, _ = known[key]
+        known[key] = (size, mtime_ns, "cached")
+
+    files = AudioScanner(tmp_path, algorithm="md5", workers=2).scan(known=known)
+    assert files[0].filehash == "cached"
+    (tmp_path / "other.wav").write_bytes(b"abc")
+    files = {f.name: f.filehash for f in AudioScanner(tmp_path, algorithm="md5").scan(known=known)}
+    assert len(files["other.wav"]) == 32
@@ -0,0 +1,83 @@
+from pathlib import Path
+import sys
+
+# Ensure repository root on path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from audio_inventory import AudioFile, AudioRepository
+from backup_coverage import CoverageEngine
+
+
+def _row(root: Path, name: str, digest: str, size: int) -> AudioFile:
+    return AudioFile(name=name, parent=root.name, path=root / name, extension=".mp3", filehash=digest, size=size)
+
+
+def test_report_counts_replicas_and_unique_bytes(tmp_path: Path) -> None:
+    """Coverage should count holders per hash and bytes unique to each root."""
+
+    muze = tmp_path / "40_Muze"
+    backup = tmp_path / "40_Muze_Backup"
+    other = tmp_path / "40_Muze_f"
+    a, b, c, d = ("a" * 40, "b" * 40, "c" * 40, "d" * 40)
+    db = tmp_path / "inv.db"
+    with AudioRepository(db) as repo:
+        repo.create_schema()
+        repo.add_files(
+            [
+                _row(muze, "1.mp3", a, 10),
+                _row(muze, "2.mp3", b, 20),
+                _row(muze, "2copy.mp3", b, 20),
+                _row(muze, "3.mp3", c, 30),
+                _row(backup, "1.mp3", a, 10),
+                _row(backup, "2.mp3", b, 20),
+                _row(other, "1.mp3", a, 10),
+                _row(other, "4.mp3", d, 40),
+            ]
+        )
+
+    engine = CoverageEngine(db, [muze, backup, other]).load()
+    report = engine.report(min_replicas=2)
+
+    m = report.roots[str(muze)]
+    assert (m.files, m.contents, m.bytes) == (4, 3, 60)
+    assert (m.unique_contents, m.unique_bytes) == (1, 30)
+    assert report.roots[str(backup)].unique_contents == 0
+    assert report.roots[str(other)].unique_bytes == 40
+    assert report.replicas == {1: 2, 2: 1, 3: 1}
+    assert [(u.digest_prefix, u.roots) for u in report.under_replicated] == [
+        ("c" * 16, [str(muze)]),
+        ("d" * 16, [str(other)]),
+    ]
+    assert [u.digest_prefix for u in engine.report(min_replicas=3).under_replicated] == ["b" * 16, "c" * 16, "d" * 16]
+    assert engine.paths_for("c" * 16) == [(c, str(muze / "3.mp3"))]
+
+
+def test_rows_without_size_are_reported_separately(tmp_path: Path) -> None:
+    """Legacy rows with NULL size should be counted, not summed as zero bytes."""
+
+    muze = tmp_path / "40_Muze"
+    backup = tmp_path / "40_Muze_Backup"
+    a, b, c = ("a" * 40, "b" * 40, "c" * 40)
+    db = tmp_path / "inv.db"
+    with AudioRepository(db) as repo:
+        repo.create_schema()
+        repo.add_files(
+            [
+                _row(muze, "1.mp3", a, 10),
+                _row(muze, "2.mp3", b, 20),
+                _row(muze, "3.mp3", c, 30),
+                _row(backup, "1.mp3", a, 10),
+                _row(backup, "2.mp3", b, 20),
+            ]
+        )
+        assert repo.conn is not None
+        with repo.conn:
+            # b has a size on the backup copy only; c has none anywhere.
+            repo.conn.execute("UPDATE audiofiles SET size = NULL WHERE path IN (?, ?)", (str(muze / "2.mp3"), str(muze / "3.mp3")))
+
+    report = CoverageEngine(db, [muze, backup]).report()
+    m = report.roots[str(muze)]
+    assert (m.files, m.contents, m.unsized_files) == (3, 3, 2)
+    assert (m.bytes, m.unsized_contents) == (30, 1)
+    assert (m.unique_contents, m.unique_bytes, m.unique_unsized) == (1, 0, 1)
+    assert [(u.digest_prefix, u.size) for u in report.under_replicated] == [("c" * 16, None)]
@@ -0,0 +1,69 @@
+from pathlib import Path
+import json
+import sys
+
+# Ensure repository root on path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from benchmark import LibrarySpec, compare_results, generate_library, main, run_benchmark
+
+
+def test_generate_library_honours_spec(tmp_path: Path) -> None:
+    """generate_library should create the requested number of files and duplicates."""
+
+    spec = LibrarySpec(file_count=40, mean_size=256, size_distribution="fixed", depth=2, duplicate_ratio=0.5, seed=1)
+    total = generate_library(tmp_path, spec)
+
+    files = [p for p in tmp_path.rglob("*") if p.is_file()]
+    assert len(files) == 40
+    assert total == 40 * 256
+    contents = {p.read_bytes() for p in files}
+    assert len(contents) < 40
+    assert all(len(p.relative_to(tmp_path).parts) <= 3 for p in files)
+
+
+def test_run_benchmark_reports_each_phase(tmp_path: Path) -> None:
+    """run_benchmark should time walk, hash and insert phases separately."""
+
+    result = run_benchmark(LibrarySpec(file_count=10, mean_size=128), tmp_path, gd_shows=5)
+
+    phases = {p["phase"]: p for p in result["phases"]}
+    assert set(phases) == {"walk", "hash", "insert", "gd_insert"}
+    assert phases["hash"]["files"] == 10
+    assert phases["hash"]["bytes"] == result["total_bytes"]
+    assert phases["gd_insert"]["files"] == 15
+    assert phases["walk"]["files"] == 10 and phases["walk"]["seconds"] > 0
+    assert result["peak_rss_bytes"]
+    if Path("/proc/self/clear_refs").exists():
+        assert all(p["peak_rss_bytes"] for p in result["phases"])
+    assert compare_results(result, result)["hash"] in (1.0, None)
+
+
+def test_main_writes_json(tmp_path: Path, capsys) -> None:
+    """The command line should write machine-readable results."""
+
+    out = tmp_path / "bench.json"
+    assert main(["--files", "5", "--mean-size", "64", "--gd-shows", "0", "--output", str(out)]) == 0
+    data = json.loads(out.read_text())
+    assert [p["phase"] for p in data["phases"]] == ["walk", "hash", "insert"]
+
+
+def test_hash_phase_uses_scanner_options(tmp_path: Path, monkeypatch) -> None:
+    """The hash phase should run AudioScanner with the workers, chunk size and algorithm given."""
+
+    import benchmark
+
+    seen = []
+    original = benchmark.AudioScanner.iter_files
+
+    def iter_files(self, *args, **kwargs):
+        seen.append((self.algorithm, self.workers, self.chunk_size))
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(benchmark.AudioScanner, "iter_files", iter_files)
+    out = tmp_path / "bench.json"
+    argv = ["--files", "6", "--gd-shows", "0", "--workers", "3", "--chunk-size", "4096", "--hash-algorithm", "md5"]
+    assert main(argv + ["--output", str(out)]) == 0
+    assert seen == [("md5", 3, 4096)]
+    spec = json.loads(out.read_text())["spec"]
+    assert (spec["algorithm"], spec["workers"], spec["chunk_size"]) == ("md5", 3, 4096)
@@ -0,0 +1,104 @@
+from pathlib import Path
+import os
+import sys
+
+# Ensure repository root on path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from directory_index import DirectoryIndex
+
+
+def _make_tree(base: Path) -> None:
+    for rel, size in [("a/x/one.mp3", 100), ("a/x/two.mp3", 50), ("a/y/x/three.mp3", 10), ("b/x/four.mp3", 500), ("top.txt", 1)]:
+        path = base / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"0" * size)
+
+
+def test_build_stores_parent_linked_tree(tmp_path: Path) -> None:
+    """Repeated directory names should all be indexed with correct totals."""
+
+    root = tmp_path / "drive"
+    _make_tree(root)
+    index = DirectoryIndex(tmp_path / "dirs.db")
+    index.init_schema()
+
+    assert index.build(root, batch_size=2) == 7
+
+    top = index.largest_subtrees(root, depth=0)[0]
+    assert top.path == str(root)
+    assert (top.total_files, top.total_bytes, top.file_count) == (5, 661, 1)
+
+    nodes = index.largest_subtrees(root, limit=10)
+    by_path = {n.path: n for n in nodes}
+    assert len(nodes) == 6
+    assert nodes[0].path == os.path.join(str(root), "b")
+    assert by_path[os.path.join(str(root), "a")].total_bytes == 160
+    assert by_path[os.path.join(str(root), "a", "y", "x")].total_bytes == 10
+    assert [c.name for c in index.children(by_path[os.path.join(str(root), "a")].id)] == ["x", "y"]
+
+
+def test_rebuild_replaces_previous_index(tmp_path: Path) -> None:
+    """Building the same root twice should not duplicate rows."""
+
+    root = tmp_path / "drive"
+    _make_tree(root)
+    other = tmp_path / "other"
+    (other / "z").mkdir(parents=True)
+    index = DirectoryIndex(tmp_path / "dirs.db")
+    index.init_schema()
+    index.build(root)
+    index.build(other)
+    (root / "b" / "x" / "four.mp3").unlink()
+    index.build(root)
+
+    assert index.roots() == sorted([str(root), str(other)])
+    assert index.largest_subtrees(root, depth=0)[0].total_bytes == 161
+    assert len(index.largest_subtrees(root, limit=100)) == 6
+    assert [n.name for n in index.largest_subtrees(other)] == ["z"]
+
+
+def test_build_does_not_lock_database_during_walk(tmp_path: Path, monkeypatch) -> None:
+    """Other writers should be able to use the database while a tree is walked."""
+
+    import sqlite3
+
+    import directory_index
+
+    root = tmp_path / "drive"
+    _make_tree(root)
+    db = tmp_path / "dirs.db"
+    index = DirectoryIndex(db)
+    index.init_schema()
+    index.build(root)
+    original = directory_index._open
+    writes = []
+
+    def open_and_write(path):
+        with sqlite3.connect(db, timeout=0) as other:
+            other.execute("CREATE TABLE IF NOT EXISTS audiofiles (path TEXT)")
+            other.execute("INSERT INTO audiofiles VALUES (?)", (path,))
+        writes.append(path)
+        return original(path)
+
+    monkeypatch.setattr(directory_index, "_open", open_and_write)
+    assert index.build(root, batch_size=1) == 7
+    assert len(writes) == 7
+    assert len(index.largest_subtrees(root, limit=100)) == 6
+
+
+def test_roots_are_resolved(tmp_path: Path, monkeypatch) -> None:
+    """Relative and absolute spellings of a root should refer to the same index."""
+
+    root = tmp_path / "drive"
+    _make_tree(root)
+    index = DirectoryIndex(tmp_path / "dirs.db")
+    index.init_schema()
+    monkeypatch.chdir(tmp_path)
+    index.build(Path("drive"))
+
+    monkeypatch.chdir(root)
+    nodes = index.largest_subtrees(Path("."), limit=100)
+    assert len(nodes) == 6
+    assert all(Path(n.path).is_absolute() for n in nodes)
+    assert index.roots() == [str(root.resolve())]
@@ -0,0 +1,97 @@
+from pathlib import Path
+import sqlite3
+import sys
+
+import pytest
+
+# Ensure repository root on path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from audio_inventory import AudioInventory
+from exporter import export_table, import_table
+from grateful_dead import build_database_and_files
+
+DATA = Path(__file__).resolve().parent.parent / "data"
+
+
+def _inventory(tmp_path: Path) -> Path:
+    music = tmp_path / "music"
+    music.mkdir()
+    (music / "a.flac").write_bytes(b"x" * 100)
+    (music / "b.mp3").write_bytes(b"y" * 10)
+    (music / "c.flac").write_bytes(b"z" * 5)
+    db = tmp_path / "inv.db"
+    AudioInventory(music, db).run()
+    return db
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".jsonl.gz"])
+def test_export_projects_and_filters_then_imports(tmp_path: Path, suffix: str) -> None:
+    """Projected, filtered exports should round-trip through import_table."""
+
+    db = _inventory(tmp_path)
+    dest = tmp_path / f"flac{suffix}"
+    count = export_table(
+        db,
+        "audiofiles",
+        dest,
+        columns=["path", "filehash", "size"],
+        filters=[("extension", "=", ".flac"), ("size", ">=", 10)],
+        batch_size=1,
+    )
+    assert count == 1
+
+    restored = tmp_path / "restored.db"
+    assert import_table(restored, "audiofiles", dest) == 1
+    with sqlite3.connect(restored) as conn:
+        rows = conn.execute("SELECT name, path, size FROM audiofiles").fetchall()
+    assert rows == [(None, str(tmp_path / "music" / "a.flac"), 100)]
+
+
+def test_export_rejects_unknown_columns(tmp_path: Path) -> None:
+    """Column names are validated before being placed in SQL."""
+
+    db = _inventory(tmp_path)
+    with pytest.raises(ValueError):
+        export_table(db, "audiofiles", tmp_path / "x.jsonl", columns=["path; DROP TABLE audiofiles"])
+    with pytest.raises(ValueError):
+        export_table(db, "audiofiles", tmp_path / "x.csv")
+    with pytest.raises(ValueError):
+        export_table(db, "audiofiles", tmp_path / "x.jsonl", filters=[("extension", "in", ".mp3,.flac")])
+
+
+def test_grateful_dead_tables_round_trip(tmp_path: Path) -> None:
+    """shows and recordings should export and restore into a fresh database."""
+
+    db = tmp_path / "gd.db"
+    build_database_and_files(db, tmp_path / "gd", DATA / "gd_shows.csv", DATA / "gd_recordings.csv")
+    for table in ("shows", "recordings"):
+        export_table(db, table, tmp_path / f"{table}.jsonl.gz")
+    restored = tmp_path / "restored.db"
+    assert import_table(restored, "shows", tmp_path / "shows.jsonl.gz") == 5
+    assert import_table(restored, "recordings", tmp_path / "recordings.jsonl.gz") == 10
+
+
+def test_parquet_round_trip(tmp_path: Path) -> None:
+    """Parquet export should work when pyarrow is installed."""
+
+    pytest.importorskip("pyarrow")
+    db = _inventory(tmp_path)
+    dest = tmp_path / "audio.parquet"
+    assert export_table(db, "audiofiles", dest, filters=[("extension", "in", [".mp3", ".flac"])]) == 3
+    restored = tmp_path / "restored.db"
+    assert import_table(restored, "audiofiles", dest) == 3
+
+
+def test_zstd_round_trip(tmp_path: Path) -> None:
+    """zstd-compressed JSON lines should export and import when zstandard is installed."""
+
+    pytest.importorskip("zstandard")
+    db = _inventory(tmp_path)
+    dest = tmp_path / "audio.jsonl.zst"
+    assert export_table(db, "audiofiles", dest, batch_size=2) == 3
+    restored = tmp_path / "restored.db"
+    assert import_table(restored, "audiofiles", dest, batch_size=2) == 3
+    with sqlite3.connect(db) as src, sqlite3.connect(restored) as dst:
+        query = "SELECT path, filehash, size FROM audiofiles ORDER BY path"
+        assert dst.execute(query).fetchall() == src.execute(query).fetchall()
@@ -0,0 +1,104 @@
+from pathlib import Path
+import os
+import sys
+
+# Ensure repository root on path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import audio_inventory
+from audio_inventory import AudioScanner, file_hash
+from hash_cache import HashCache
+
+
+def test_file_hash_uses_cache(tmp_path: Path) -> None:
+    """A cached digest should be returned without reading the file again."""
+
+    song = tmp_path / "song.mp3"
+    song.write_bytes(b"abc")
+    with HashCache(tmp_path / "cache.db") as cache:
+        digest = file_hash(song, cache=cache)
+        assert cache.misses == 1
+        cache.flush()
+        assert file_hash(song, cache=cache) == digest
+        assert cache.hits == 1
+
+        # A modified file has a different size/mtime and misses the cache.
+        song.write_bytes(b"abcd")
+        assert file_hash(song, cache=cache) != digest
+
+
+def test_scanner_consults_cache_before_reading(tmp_path: Path, monkeypatch) -> None:
+    """AudioScanner should skip hashing files already in the cache."""
+
+    (tmp_path / "a.flac").write_bytes(b"data")
+    cache_path = tmp_path / "cache.db"
+    with HashCache(cache_path) as cache:
+        first = AudioScanner(tmp_path, cache=cache).scan()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("file was re-hashed")
+
+    monkeypatch.setattr(audio_inventory, "file_hash", fail)
+    with HashCache(cache_path) as cache:
+        second = AudioScanner(tmp_path, cache=cache, workers=2).scan()
+    assert second[0].filehash == first[0].filehash
+
+
+def test_lru_eviction_keeps_recent_entries(tmp_path: Path) -> None:
+    """Entries beyond max_entries should be evicted least-recently-used first."""
+
+    stats = []
+    for i in range(4):
+        path = tmp_path / f"f{i}.mp3"
+        path.write_bytes(bytes([i]))
+        stats.append(os.stat(path))
+
+    with HashCache(tmp_path / "cache.db", max_entries=2, flush_every=1) as cache:
+        cache.put(stats[0], "sha1", "00" * 20)
+        cache.conn.execute("UPDATE hashes SET last_used = 1")
+        cache.conn.commit()
+        cache.put(stats[1], "sha1", "11" * 20)
+        cache.put(stats[2], "sha1", "22" * 20)
+        assert len(cache) == 2
+        assert cache.get(stats[0], "sha1") is None
+        assert cache.get(stats[2], "sha1") == "22" * 20
+
+
+def test_export_import_between_hosts(tmp_path: Path) -> None:
+    """Exported entries should import into another cache, remapping devices."""
+
+    song = tmp_path / "song.mp3"
+    song.write_bytes(b"abc")
+    st = os.stat(song)
+    export = tmp_path / "cache.jsonl.gz"
+    with HashCache(tmp_path / "a.db") as cache:
+        cache.put(st, "sha1", "ab" * 20)
+        assert cache.export_to(export) == 1
+
+    with HashCache(tmp_path / "b.db") as other:
+        assert other.import_from(export, device_map={st.st_dev: st.st_dev + 1}) == 1
+        assert other.get(st, "sha1") is None
+        (value,) = other.conn.execute("SELECT dev FROM hashes").fetchone()
+        assert value == st.st_dev + 1
+
+
+def test_entry_count_is_tracked_without_counting_table(tmp_path: Path) -> None:
+    """Flushes should keep the stored count exact without scanning the table."""
+
+    stats = []
+    for i in range(3):
+        path = tmp_path / f"f{i}.mp3"
+        path.write_bytes(bytes([i]))
+        stats.append(os.stat(path))
+
+    db = tmp_path / "cache.db"
+    with HashCache(db, max_entries=10, flush_every=1) as first, HashCache(db, max_entries=10, flush_every=1) as second:
+        statements = []
+        first.conn.set_trace_callback(statements.append)
+        first.put(stats[0], "sha1", "00" * 20)
+        first.put(stats[0], "sha1", "01" * 20)
+        second.put(stats[1], "sha1", "11" * 20)
+        first.put(stats[2], "sha1", "22" * 20)
+        assert len(first) == len(second) == 3
+        assert first.get(stats[0], "sha1") == "01" * 20
+        assert not [s for s in statements if "COUNT(*)" in s]
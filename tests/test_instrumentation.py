@@ -0,0 +1,76 @@
+from pathlib import Path
+import json
+import sys
+
+# Ensure repository root on path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from audio_inventory import AudioInventory, AudioScanner
+from instrumentation import ScanInstrumentation, write_metrics
+
+
+def test_scanner_reports_progress_and_slow_files(tmp_path: Path) -> None:
+    """Instrumented scans should emit progress and flag slow files."""
+
+    (tmp_path / "a.mp3").write_bytes(b"x" * 10)
+    (tmp_path / "b.flac").write_bytes(b"y" * 30)
+    events = []
+    slow = []
+    instr = ScanInstrumentation(
+        on_progress=events.append,
+        on_slow_file=lambda path, seconds: slow.append(path.name),
+        slow_file_seconds=0.0,
+        progress_interval=0.0,
+    )
+
+    files = AudioScanner(tmp_path).scan(instrumentation=instr)
+
+    assert len(files) == 2
+    assert {f.size for f in files} == {10, 30}
+    assert events[-1].files_done == events[-1].files_total == 2
+    assert events[-1].bytes_done == events[-1].bytes_total == 40
+    assert events[-1].eta == 0
+    assert sorted(slow) == ["a.mp3", "b.flac"]
+    assert set(instr.phases) == {"walk", "hash"}
+
+
+def test_inventory_run_returns_report(tmp_path: Path) -> None:
+    """AudioInventory.run should return a ScanReport with phase timings."""
+
+    music = tmp_path / "music"
+    music.mkdir()
+    (music / "mix.wav").write_bytes(b"data")
+    report = AudioInventory(music, tmp_path / "inv.db").run(instrumentation=ScanInstrumentation())
+
+    assert report.files == 1
+    assert report.bytes == 4
+    assert set(report.phases) == {"walk", "hash", "insert"}
+
+    write_metrics(report, tmp_path / "metrics.json")
+    assert json.loads((tmp_path / "metrics.json").read_text())["files"] == 1
+    write_metrics(report, tmp_path / "metrics.prom")
+    text = (tmp_path / "metrics.prom").read_text()
+    assert f'py_inv_scan_files_total{{root="{music}"}} 1' in text
+    assert 'phase="hash"' in text
+
+
+def test_uninstrumented_run_streams_and_counts(tmp_path: Path, monkeypatch) -> None:
+    """Without instrumentation the scanner gets none and the report comes from the counts."""
+
+    music = tmp_path / "music"
+    music.mkdir()
+    (music / "a.wav").write_bytes(b"data")
+    (music / "b.mp3").write_bytes(b"more data")
+    passed = []
+    original = AudioScanner.iter_files
+
+    def iter_files(self, instrumentation=None, known=None):
+        passed.append(instrumentation)
+        return original(self, instrumentation=instrumentation, known=known)
+
+    monkeypatch.setattr(AudioScanner, "iter_files", iter_files)
+    report = AudioInventory(music, tmp_path / "inv.db").run(batch_size=1)
+
+    assert passed == [None]
+    assert (report.files, report.bytes) == (2, 13)
+    assert set(report.phases) == {"total"}
@@ -0,0 +1,100 @@
+from pathlib import Path
+import sqlite3
+import subprocess
+import sys
+
+# Ensure repository root on path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import archive_scanner
+from archive_scanner import ArchiveShow
+from py_inv import main
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_help_does_not_import_worker_modules() -> None:
+    """Building the parser should not pull in hashing, SQLite or network code."""
+
+    code = (
+        "import sys, py_inv\n"
+        "py_inv.build_parser().format_help()\n"
+        "loaded = {'audio_inventory', 'archive_scanner', 'hashlib', 'urllib.request', 'sqlite3'} & set(sys.modules)\n"
+        "print(sorted(loaded))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def test_scan_query_dupes_and_rescan(tmp_path: Path, capsys) -> None:
+    """Subcommands should scan, look up, report duplicates and prune."""
+
+    music = tmp_path / "music"
+    music.mkdir()
+    (music / "a.mp3").write_bytes(b"same")
+    (music / "b.mp3").write_bytes(b"same")
+    (music / "c.flac").write_bytes(b"other")
+    db = tmp_path / "inv.db"
+
+    assert main(["scan", str(music), "--db", str(db), "--workers", "2", "--batch-size", "1"]) == 0
+    assert main(["dupes", "--db", str(db)]) == 0
+    out = capsys.readouterr().out
+    assert str(music / "a.mp3") in out and str(music / "c.flac") not in out.split("\n", 1)[1]
+
+    assert main(["query", "--db", str(db), "--path", "c.fl"]) == 0
+    assert str(music / "c.flac") in capsys.readouterr().out
+
+    (music / "a.mp3").unlink()
+    assert main(["rescan", str(music), "--db", str(db)]) == 0
+    with sqlite3.connect(db) as conn:
+        paths = {row[0] for row in conn.execute("SELECT path FROM audiofiles")}
+    assert paths == {str(music / "b.mp3"), str(music / "c.flac")}
+    assert main(["query", "--db", str(db), "--path", "a.mp3"]) == 1
+
+
+def test_archive_sync_stores_items(tmp_path: Path, monkeypatch) -> None:
+    """archive-sync should store fetched items in the Grateful Dead database."""
+
+    monkeypatch.setattr(
+        archive_scanner,
+        "fetch_archive_shows",
+        lambda start, end: [ArchiveShow(title="GD 1977-05-08", identifier="gd1977-05-08")],
+    )
+    db = tmp_path / "gd.db"
+    assert main(["archive-sync", "--db", str(db), "--start-year", "1977", "--end-year", "1977"]) == 0
+    with sqlite3.connect(db) as conn:
+        assert conn.execute("SELECT identifier FROM archive_shows").fetchall() == [("gd1977-05-08",)]
+
+
+def test_export_where_in_splits_values(tmp_path: Path) -> None:
+    """``--where COLUMN in a,b`` should match each comma-separated value."""
+
+    music = tmp_path / "music"
+    music.mkdir()
+    for name in ("a.mp3", "b.flac", "c.wav"):
+        (music / name).write_bytes(name.encode())
+    db = tmp_path / "inv.db"
+    assert main(["scan", str(music), "--db", str(db)]) == 0
+
+    dest = tmp_path / "out.jsonl"
+    assert main(["export", "audiofiles", str(dest), "--db", str(db), "--where", "extension", "in", ".mp3,.flac"]) == 0
+    assert len(dest.read_text().splitlines()) == 2
+
+
+def test_relative_and_absolute_roots_share_rows(tmp_path: Path, monkeypatch) -> None:
+    """Scanning ``.`` and the absolute root should store and prune the same keys."""
+
+    music = tmp_path / "music"
+    music.mkdir()
+    (music / "a.mp3").write_bytes(b"a")
+    (music / "b.mp3").write_bytes(b"b")
+    db = tmp_path / "inv.db"
+    monkeypatch.chdir(music)
+
+    assert main(["scan", ".", "--db", str(db)]) == 0
+    assert main(["scan", str(music), "--db", str(db)]) == 0
+    (music / "b.mp3").unlink()
+    assert main(["rescan", ".", "--db", str(db)]) == 0
+    with sqlite3.connect(db) as conn:
+        paths = [row[0] for row in conn.execute("SELECT path FROM audiofiles")]
+    assert paths == [str(music.resolve() / "a.mp3")]
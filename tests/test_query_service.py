@@ -0,0 +1,155 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import json
+import sys
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+# Ensure repository root on path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from audio_inventory import AudioInventory
+from grateful_dead import build_database_and_files
+from query_service import QueryServer, QueryService
+
+DATA = Path(__file__).resolve().parent.parent / "data"
+
+
+@pytest.fixture
+def server(tmp_path: Path):
+    music = tmp_path / "music"
+    music.mkdir()
+    (music / "a.mp3").write_bytes(b"same")
+    (music / "b.mp3").write_bytes(b"same")
+    (music / "c.flac").write_bytes(b"other")
+    db = tmp_path / "inv.db"
+    AudioInventory(music, db).run()
+    gd_db = tmp_path / "gd.db"
+    build_database_and_files(gd_db, tmp_path / "gd", DATA / "gd_shows.csv", DATA / "gd_recordings.csv")
+
+    service = QueryService(db, gd_db=gd_db, pool_size=4)
+    httpd = QueryServer(service, port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", music, db, service
+    httpd.shutdown()
+    httpd.server_close()
+    service.close()
+
+
+def _get(url: str):
+    with urllib.request.urlopen(url, timeout=10) as resp:
+        return json.loads(resp.read())
+
+
+def test_lookups(server) -> None:
+    """Hash, path, show and duplicate endpoints should return JSON."""
+
+    base, music, _, _ = server
+    rows = _get(f"{base}/path?q=c.flac")
+    assert [r["path"] for r in rows] == [str(music / "c.flac")]
+    assert [r["name"] for r in _get(f"{base}/hash/{rows[0]['filehash']}")] == ["c.flac"]
+
+    dupes = _get(f"{base}/dupes")
+    assert len(dupes) == 1 and len(dupes[0]["paths"]) == 2
+    assert _get(f"{base}/dupes?min=5") == []
+
+    shows = _get(f"{base}/shows?date=1969-02-11")
+    assert shows[0]["recordings"] == ["SBD", "AUD"]
+
+    with pytest.raises(urllib.error.HTTPError) as err:
+        _get(f"{base}/nope")
+    assert err.value.code == 404
+
+
+def test_cache_invalidated_when_scan_commits(server) -> None:
+    """A new scan should be visible to cached queries immediately."""
+
+    base, music, db, service = server
+    assert _get(f"{base}/path?q=new") == []
+    assert _get(f"{base}/path?q=new") == []
+    assert service.cache.hits == 1
+
+    (music / "new.wav").write_bytes(b"fresh")
+    AudioInventory(music, db).run(incremental=True)
+    assert [r["name"] for r in _get(f"{base}/path?q=new")] == ["new.wav"]
+
+
+def test_concurrent_requests(server) -> None:
+    """Many simultaneous requests should all succeed."""
+
+    base, _, _, _ = server
+    urls = [f"{base}/path?q={name}" for name in ("a.mp3", "b.mp3", "c.flac", "mp3")] * 50
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        results = list(pool.map(_get, urls))
+    assert all(results[i] for i in range(len(urls)))
+
+
+def test_path_limit_and_large_bodies_not_cached(server) -> None:
+    """/path should cap its results, and oversized bodies should bypass the cache."""
+
+    base, _, _, service = server
+    assert len(_get(f"{base}/path?q=mp3&limit=1")) == 1
+    with pytest.raises(urllib.error.HTTPError) as err:
+        _get(f"{base}/path?q=mp3&limit=1000000")
+    assert err.value.code == 400
+
+    service.cache.max_entry_bytes = 10
+    service.cache.invalidate()
+    _get(f"{base}/path?q=mp3")
+    _get(f"{base}/path?q=mp3")
+    assert service.cache.hits == 0
+
+
+def test_exhausted_pool_answers_503(server) -> None:
+    """Requests should get a 503 instead of waiting forever for a connection."""
+
+    _, _, db, _ = server
+    service = QueryService(db, pool_size=1, wal=False, pool_timeout=0.1)
+    httpd = QueryServer(service, port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{httpd.server_address[1]}"
+    try:
+        with service.pool.connection():
+            for url in (f"{base}/path?q=mp3", f"{base}/dupes"):
+                with pytest.raises(urllib.error.HTTPError) as err:
+                    _get(url)
+                assert err.value.code == 503
+        assert len(_get(f"{base}/dupes")) == 1
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        service.close()
+
+
+def test_error_while_streaming_closes_connection(server, monkeypatch) -> None:
+    """A failure after the headers went out should truncate the body, not append a response."""
+
+    import socket
+    import sqlite3
+
+    base, _, _, service = server
+
+    def failing(min_copies: int = 2):
+        yield "ab" * 20, ["x"]
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr("audio_inventory.AudioRepository.duplicates", lambda self, min_copies=2: failing())
+    host, port = base[len("http://"):].split(":")
+    with socket.create_connection((host, int(port)), timeout=10) as sock:
+        sock.sendall(b"GET /dupes HTTP/1.1\r\nHost: x\r\n\r\n")
+        data = b""
+        while True:
+            part = sock.recv(65536)
+            if not part:
+                break
+            data += part
+    assert data.count(b"HTTP/1.1") == 1
+    assert b"disk I/O error" not in data
+    assert not data.endswith(b"0\r\n\r\n")
+    # The connection went back to the pool.
+    assert service.pool._idle.qsize() == 4
@@ -0,0 +1,72 @@
+from pathlib import Path
+import sqlite3
+import sys
+
+# Ensure repository root on path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from py_inv import main
+from shards import FederatedReader, ShardedInventory, compact_shard, merge_shards, shard_name
+
+
+def _drive(base: Path, name: str, files: dict) -> Path:
+    root = base / name
+    root.mkdir()
+    for filename, data in files.items():
+        (root / filename).write_bytes(data)
+    return root
+
+
+def test_each_root_gets_its_own_wal_shard(tmp_path: Path) -> None:
+    """Roots sharing a name prefix should still map to separate WAL shards."""
+
+    a = _drive(tmp_path, "40_Muze", {"x.mp3": b"same", "y.mp3": b"a-only"})
+    b = _drive(tmp_path, "40_Muze_Backup", {"x.mp3": b"same"})
+    sharded = ShardedInventory(tmp_path / "shards")
+    sharded.inventory(a).run()
+    sharded.inventory(b).run()
+
+    assert shard_name(a) != shard_name(b)
+    assert len(sharded.shards()) == 2
+    with sqlite3.connect(sharded.shard_for(a)) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_federated_reader_spans_shards(tmp_path: Path) -> None:
+    """Lookups should combine rows from every shard, also beyond one ATTACH group."""
+
+    sharded = ShardedInventory(tmp_path / "shards")
+    for i in range(3):
+        root = _drive(tmp_path, f"drive{i}", {"x.mp3": b"same", f"u{i}.mp3": bytes([i])})
+        sharded.inventory(root).run()
+
+    with FederatedReader(sharded.shards(), max_attached=2) as reader:
+        dupes = list(reader.duplicates())
+        assert len(dupes) == 1 and len(dupes[0][1]) == 3
+        digest = dupes[0][0]
+        assert {row["shard"] for row in reader.find_by_hash(digest)} == {p.stem for p in sharded.shards()}
+        assert [row["name"] for row in reader.search_paths("u1")] == ["u1.mp3"]
+
+
+def test_compact_and_merge_shards(tmp_path: Path) -> None:
+    """Shards should compact in place and merge into one database."""
+
+    sharded = ShardedInventory(tmp_path / "shards")
+    for i in range(2):
+        sharded.inventory(_drive(tmp_path, f"drive{i}", {"a.flac": bytes([i])})).run()
+    for shard in sharded.shards():
+        compact_shard(shard)
+
+    merged = tmp_path / "merged.db"
+    assert merge_shards(sharded.shards(), merged) == 2
+    assert merge_shards(sharded.shards(), merged) == 2
+
+
+def test_cli_scan_and_query_shards(tmp_path: Path, capsys) -> None:
+    """--shard-dir should route scans to shards and queries through the reader."""
+
+    root = _drive(tmp_path, "music", {"song.wav": b"data"})
+    shard_dir = tmp_path / "shards"
+    assert main(["scan", str(root), "--shard-dir", str(shard_dir)]) == 0
+    assert main(["query", "--shard-dir", str(shard_dir), "--path", "song"]) == 0
+    assert str(root / "song.wav") in capsys.readouterr().out
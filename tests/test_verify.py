@@ -0,0 +1,119 @@
+from pathlib import Path
+import os
+import sqlite3
+import sys
+
+# Ensure repository root on path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from audio_inventory import AudioInventory
+from verify import (
+    STATUS_CHANGED,
+    STATUS_MISMATCH,
+    STATUS_MISSING,
+    STATUS_OK,
+    STATUS_UNREADABLE,
+    RateLimiter,
+    VerificationScheduler,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.slept = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.slept += seconds
+        self.now += seconds
+
+
+def test_rate_limiter_enforces_rate() -> None:
+    """Consuming more than the burst should sleep for the excess."""
+
+    clock = FakeClock()
+    limiter = RateLimiter(100, burst=100, clock=clock, sleep=clock.sleep)
+    limiter.acquire(100)
+    assert clock.slept == 0
+    limiter.acquire(50)
+    assert clock.slept == 0.5
+    clock.now += 1.0
+    limiter.acquire(100)
+    assert clock.slept == 0.5
+
+
+def test_rotating_slices_cover_library_and_record_problems(tmp_path: Path) -> None:
+    """Runs should verify oldest first and record mismatches and missing files."""
+
+    music = tmp_path / "music"
+    music.mkdir()
+    for i in range(4):
+        (music / f"{i}.mp3").write_bytes(bytes([i]) * 10)
+    db = tmp_path / "inv.db"
+    AudioInventory(music, db).run()
+    # Corrupt the content in place, keeping size and mtime, as bit rot would.
+    rotten = music / "1.mp3"
+    st = rotten.stat()
+    rotten.write_bytes(b"X" * 10)
+    os.utime(rotten, ns=(st.st_atime_ns, st.st_mtime_ns))
+    (music / "2.mp3").unlink()
+
+    clock = FakeClock()
+    scheduler = VerificationScheduler(
+        db, period_days=2, runs_per_day=1, bytes_per_second=10, chunk_size=4, clock=clock, sleep=clock.sleep
+    )
+    scheduler.init_schema()
+    first = scheduler.run()
+    second = scheduler.run()
+
+    assert first.checked == second.checked == 2
+    assert clock.slept > 0
+    assert [m[0] for m in first.mismatches + second.mismatches] == [str(music / "1.mp3")]
+    assert first.missing + second.missing == [str(music / "2.mp3")]
+    with sqlite3.connect(db) as conn:
+        status = dict(conn.execute("SELECT path, verify_status FROM audiofiles"))
+        assert conn.execute("SELECT COUNT(*) FROM audiofiles WHERE last_verified IS NULL").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM verify_mismatches").fetchone()[0] == 1
+    assert status[str(music / "0.mp3")] == STATUS_OK
+    assert status[str(music / "1.mp3")] == STATUS_MISMATCH
+    assert status[str(music / "2.mp3")] == STATUS_MISSING
+
+    third = scheduler.run(limit=1)
+    assert third.checked == 1
+
+
+def test_changed_and_unreadable_files_are_recorded(tmp_path: Path) -> None:
+    """Edited files are ``changed``, not rot; unreadable ones do not abort the run."""
+
+    music = tmp_path / "music"
+    music.mkdir()
+    for name in ("a.mp3", "b.flac", "c.mp3"):
+        (music / name).write_bytes(b"abcdef")
+    db = tmp_path / "inv.db"
+    AudioInventory(music, db).run()
+    (music / "a.mp3").unlink()
+    (music / "a.mp3").mkdir()
+    (music / "b.flac").write_bytes(b"abcd")
+    with sqlite3.connect(db) as conn:
+        # A row from before size and mtime were stored, so the directory is opened.
+        conn.execute("UPDATE audiofiles SET size = NULL, mtime_ns = NULL WHERE path = ?", (str(music / "a.mp3"),))
+        conn.execute("UPDATE audiofiles SET filehash = 'abc' WHERE path = ?", (str(music / "c.mp3"),))
+
+    scheduler = VerificationScheduler(db)
+    scheduler.init_schema()
+    result = scheduler.run(limit=10)
+
+    assert result.checked == 3
+    assert result.mismatches == []
+    assert result.changed == [str(music / "b.flac")]
+    assert sorted(path for path, _ in result.unreadable) == [str(music / "a.mp3"), str(music / "c.mp3")]
+    assert dict(result.unreadable)[str(music / "a.mp3")].startswith("EISDIR")
+    with sqlite3.connect(db) as conn:
+        status = dict(conn.execute("SELECT path, verify_status FROM audiofiles"))
+        assert conn.execute("SELECT COUNT(*) FROM audiofiles WHERE last_verified IS NULL").fetchone()[0] == 0
+    assert status[str(music / "a.mp3")] == STATUS_UNREADABLE
+    assert status[str(music / "b.flac")] == STATUS_CHANGED
+    assert status[str(music / "c.mp3")] == STATUS_UNREADABLE
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+"""Scheduled, rate-limited integrity verification of stored files.
+
+Re-hashing a whole archival drive at once saturates it for a day.
+:class:`VerificationScheduler` instead re-hashes a rotating slice of the
+``audiofiles`` table on each run, least recently verified files first, sized
+so the whole library is covered once per ``period_days``.  Reads are
+throttled by :class:`RateLimiter` token buckets for bandwidth and I/O
+operations.  Every checked row gets ``last_verified`` and ``verify_status``:
+
+``ok``
+    The content still hashes to the stored digest.
+``mismatch``
+    Size and modification time are unchanged but the content is not, i.e.
+    bit rot.  Also logged in ``verify_mismatches`` with the observed hash.
+``changed``
+    Size or modification time differ from the stored values; the file was
+    rewritten and needs a rescan, so it is not re-hashed.
+``missing``
+    The file no longer exists.
+``unreadable``
+    The file could not be read (permissions, I/O error, not a regular file)
+    or the stored digest is not recognised.
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+import errno
+import math
+import os
+import sqlite3
+import time
+from typing import Callable, List, Optional, Tuple
+
+from audio_inventory import HASH_CHUNK_SIZE, AudioRepository, algorithm_for_digest
+
+STATUS_OK = "ok"
+STATUS_MISMATCH = "mismatch"
+STATUS_MISSING = "missing"
+STATUS_CHANGED = "changed"
+STATUS_UNREADABLE = "unreadable"
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` units per second.
+
+    Parameters
+    ----------
+    rate:
+        Sustained units (bytes, operations, ...) per second.
+    burst:
+        Bucket capacity; defaults to one second worth of ``rate``.
+    clock, sleep:
+        Time source and sleep function.  Exposed for tests.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = rate if burst is None else burst
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.burst
+        self._last = clock()
+
+    def acquire(self, amount: float = 1.0) -> None:
+        """Block until ``amount`` units may be used, then consume them."""
+
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+        self.tokens -= amount
+        if self.tokens < 0:
+            # Sleep off the debt; requests larger than the bucket are allowed
+            # but paid for in full.
+            self.sleep(-self.tokens / self.rate)
+            self.tokens = 0.0
+            self._last = self.clock()
+
+
+@dataclass
+class VerificationResult:
+    """Outcome of one :meth:`VerificationScheduler.run`."""
+
+    checked: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    mismatches: List[Tuple[str, str, str]] = field(default_factory=list)  # (path, expected, actual)
+    missing: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    unreadable: List[Tuple[str, str]] = field(default_factory=list)  # (path, reason)
+
+
+class VerificationScheduler:
+    """Re-hash the least recently verified slice of an inventory database.
+
+    Parameters
+    ----------
+    db_path:
+        Inventory database with an ``audiofiles`` table.
+    period_days:
+        Every file should be verified at least once within this many days.
+    runs_per_day:
+        How often :meth:`run` is invoked (e.g. by cron or Task Scheduler).
+        Together with ``period_days`` this fixes the slice size.
+    bytes_per_second:
+        Optional read bandwidth limit.
+    ios_per_second:
+        Optional limit on read operations (one per chunk).
+    chunk_size:
+        Read size in bytes.
+    clock, sleep:
+        Time source and sleep function.  Exposed for tests.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        period_days: float = 90,
+        runs_per_day: float = 1,
+        bytes_per_second: Optional[float] = None,
+        ios_per_second: Optional[float] = None,
+        chunk_size: int = HASH_CHUNK_SIZE,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.db_path = Path(db_path)
+        self.period_days = period_days
+        self.runs_per_day = runs_per_day
+        self.chunk_size = chunk_size
+        self.clock = clock
+        self.bandwidth: Optional[RateLimiter] = None
+        self.iops: Optional[RateLimiter] = None
+        if bytes_per_second:
+            # The bucket must hold at least one chunk so reads are not split.
+            burst = max(bytes_per_second, chunk_size)
+            self.bandwidth = RateLimiter(bytes_per_second, burst, clock=clock, sleep=sleep)
+        if ios_per_second:
+            self.iops = RateLimiter(ios_per_second, clock=clock, sleep=sleep)
+
+    def init_schema(self) -> None:
+        """Add verification columns, index and mismatch log to the database."""
+
+        with AudioRepository(self.db_path) as repo:
+            repo.create_schema()
+            conn = repo.conn
+            assert conn is not None
+            with conn:
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_audiofiles_last_verified ON audiofiles(last_verified)")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS verify_mismatches (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        path TEXT,
+                        expected TEXT,
+                        actual TEXT,
+                        detected_at REAL
+                    )
+                    """
+                )
+
+    def slice_size(self, conn: sqlite3.Connection) -> int:
+        """Return how many files one run must verify to meet ``period_days``."""
+
+        (total,) = conn.execute("SELECT COUNT(*) FROM audiofiles").fetchone()
+        return math.ceil(total / max(self.period_days * self.runs_per_day, 1))
+
+    def run(self, limit: Optional[int] = None, max_seconds: Optional[float] = None) -> VerificationResult:
+        """Verify the next slice of files.
+
+        Parameters
+        ----------
+        limit:
+            Number of files to check; defaults to :meth:`slice_size`.
+        max_seconds:
+            Stop early, after the current file, once this much time has passed.
+        """
+
+        result = VerificationResult()
+        start = self.clock()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            if limit is None:
+                limit = self.slice_size(conn)
+            # NULLs sort first, so never-verified files are picked up before
+            # anything else.
+            due = conn.execute(
+                "SELECT path, filehash, size, mtime_ns FROM audiofiles WHERE filehash IS NOT NULL "
+                "ORDER BY last_verified LIMIT ?",
+                (limit,),
+            ).fetchall()
+            for path, expected, size, mtime_ns in due:
+                status = self._verify(conn, Path(path), expected, size, mtime_ns, result)
+                with conn:
+                    conn.execute(
+                        "UPDATE audiofiles SET last_verified = ?, verify_status = ? WHERE path = ?",
+                        (time.time(), status, path),
+                    )
+                result.checked += 1
+                if max_seconds is not None and self.clock() - start >= max_seconds:
+                    break
+        finally:
+            conn.close()
+        result.seconds = self.clock() - start
+        return result
+
+    def _verify(
+        self,
+        conn: sqlite3.Connection,
+        path: Path,
+        expected: str,
+        size: Optional[int],
+        mtime_ns: Optional[int],
+        result: VerificationResult,
+    ) -> str:
+        try:
+            algorithm = algorithm_for_digest(expected)
+            st = os.stat(path)
+        except FileNotFoundError:
+            result.missing.append(str(path))
+            return STATUS_MISSING
+        except (OSError, ValueError) as exc:
+            result.unreadable.append((str(path), _reason(exc)))
+            return STATUS_UNREADABLE
+        # Rows written before size and mtime were recorded have NULLs here and
+        # can only be checked by hashing.
+        if (size is not None and st.st_size != size) or (mtime_ns is not None and st.st_mtime_ns != mtime_ns):
+            result.changed.append(str(path))
+            return STATUS_CHANGED
+        try:
+            actual, nbytes = self._hash(path, algorithm)
+        except FileNotFoundError:
+            result.missing.append(str(path))
+            return STATUS_MISSING
+        except OSError as exc:
+            result.unreadable.append((str(path), _reason(exc)))
+            return STATUS_UNREADABLE
+        result.bytes += nbytes
+        if actual == expected:
+            return STATUS_OK
+        result.mismatches.append((str(path), expected, actual))
+        with conn:
+            conn.execute(
+                "INSERT INTO verify_mismatches(path, expected, actual, detected_at) VALUES (?, ?, ?, ?)",
+                (str(path), expected, actual, time.time()),
+            )
+        return STATUS_MISMATCH
+
+    def _hash(self, path: Path, algorithm: str) -> Tuple[str, int]:
+        import hashlib
+
+        h = hashlib.new(algorithm)
+        nbytes = 0
+        with path.open("rb") as f:
+            while True:
+                if self.iops is not None:
+                    self.iops.acquire()
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                if self.bandwidth is not None:
+                    self.bandwidth.acquire(len(chunk))
+                h.update(chunk)
+                nbytes += len(chunk)
+        return h.hexdigest(), nbytes
+
+
+def _reason(exc: Exception) -> str:
+    """Describe why a file could not be verified, naming the errno if there is one."""
+
+    if isinstance(exc, OSError) and exc.errno is not None:
+        return f"{errno.errorcode.get(exc.errno, exc.errno)}: {exc.strerror or exc}"
+    return str(exc)